@@ -0,0 +1,61 @@
+# Cold start of the example widgets, measured with `python -X importtime`.
+#
+#   python benchmarks/benchmark_import_time.py
+#
+# Every import statement runs in a fresh python process a few times; the median of the
+# cumulative import time of all top-level modules is reported. "lazy" is what importing
+# the widget module costs now, "eager" adds the libraries the module used to import at
+# the top (napari, magicgui, PyQt's uic), which is what starting used to cost.
+import argparse
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+
+DOCS = Path(__file__).resolve().parent.parent / 'docs'
+
+# name: (folder the statement runs in, import statement)
+TARGETS = {
+    'my_custom_widget (lazy)': (DOCS / 'johannes_mueller' / 'qtdesigner_and_magicgui' / 'example',
+                                'import my_custom_widget'),
+    'my_custom_widget (eager)': (DOCS / 'johannes_mueller' / 'qtdesigner_and_magicgui' / 'example',
+                                 'import my_custom_widget, magicgui.widgets, napari.layers, qtpy.uic'),
+    'complex_widget_ui (compiled ui)': (DOCS / 'johannes_mueller' / 'qtdesigner_and_magicgui' / 'example',
+                                        'import complex_widget_ui'),
+    'qtpy.uic (ui parser)': (DOCS, 'import qtpy.uic'),
+    'flood_tool_ui (compiled ui)': (DOCS / 'marcelo_zoccoler' / 'entry_user_interf3' / 'scripts',
+                                    'import flood_tool_ui'),
+    'flood_engine': (DOCS / 'marcelo_zoccoler' / 'entry_user_interf3' / 'scripts', 'import flood_engine'),
+    'MyGUI MainWindow (example_2)': (DOCS / 'johannes_mueller' / 'entry_user_interf2' / 'scripts' / 'example_2',
+                                     'import MainWindow'),
+}
+
+
+def import_time(folder, statement):
+    # cumulative import time in ms of all top-level imports of the statement
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=folder, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):          # nested imports are indented
+            total += int(cumulative)
+    return total / 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the import time of the example widgets.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print('{:<34} {:>12}'.format('import', 'time (ms)'))
+    for name, (folder, statement) in TARGETS.items():
+        try:
+            times = [import_time(folder, statement) for _ in range(args.repeat)]
+            print('{:<34} {:>12.1f}'.format(name, statistics.median(times)))
+        except RuntimeError as error:
+            print('{:<34} {:>12}  ({})'.format(name, 'failed', error))
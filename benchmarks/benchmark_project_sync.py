@@ -0,0 +1,77 @@
+# Time of ProjectSync (devbio-napari cluster post) compared to a serial rsync of the
+# whole folder, between two local folders standing in for fileserver and project space:
+#
+#   cold      empty project space
+#   no change everything up to date
+#   edited    a few bytes changed in every file
+#
+#   python benchmarks/benchmark_project_sync.py --files 64 --size-mb 16 --streams 8
+import argparse
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+DOCS = Path(__file__).resolve().parent.parent / 'docs'
+sys.path.insert(0, str(DOCS / 'till_korten' / 'devbio-napari_cluster'))
+
+from project_sync import ProjectSync
+
+
+def make_files(folder, n_files, size):
+    for index in range(n_files):
+        path = Path(folder) / 'folder_{}'.format(index % 4) / 'image_{:03d}.tif'.format(index)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size))
+
+
+def edit_files(folder):
+    # change a few bytes in the middle of every file
+    for path in Path(folder).rglob('*.tif'):
+        with open(path, 'r+b') as file:
+            file.seek(path.stat().st_size // 2)
+            file.write(b'edited')
+
+
+def rsync(source, target):
+    subprocess.run(['rsync', '-a', str(source) + '/', str(target)], check=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ProjectSync against rsync.')
+    parser.add_argument('--files', type=int, default=32)
+    parser.add_argument('--size-mb', type=float, default=8)
+    parser.add_argument('--streams', type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        fileserver = Path(folder) / 'fileserver'
+        make_files(fileserver, args.files, int(args.size_mb * 2**20))
+
+        runs = {'ProjectSync': lambda: ProjectSync(
+            fileserver, Path(folder) / 'project_sync', n_streams=args.streams).sync_from_fileserver()}
+        if shutil.which('rsync'):
+            runs['rsync'] = lambda: rsync(fileserver, Path(folder) / 'rsync')
+        else:
+            print('rsync is not installed, only ProjectSync is measured')
+
+        times = {name: {} for name in runs}
+        for case in ('cold', 'no change', 'edited'):
+            if case == 'edited':
+                edit_files(fileserver)
+            for name, run in runs.items():
+                start = perf_counter()
+                run()
+                times[name][case] = perf_counter() - start
+
+        print('{:<12} {:>10} {:>10} {:>10}'.format('', 'cold', 'no change', 'edited'))
+        for name, cases in times.items():
+            print('{:<12} {:>10.3f} {:>10.3f} {:>10.3f}'.format(
+                name, cases['cold'], cases['no change'], cases['edited']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# Wall time and peak memory of the image processing recipes from the blog posts, on
+# synthetic 2D images from 256x256 to 8192x8192 pixels and on 3D stacks.
+#
+#   python benchmarks/benchmark_recipes.py                       # everything
+#   python benchmarks/benchmark_recipes.py --recipes flood pfa   # only some recipes
+#   python benchmarks/benchmark_recipes.py --sizes 256 1024 --output results.jsonl
+#
+# Every run appends one line per measurement to the --output file (with date and git
+# commit), so results of different versions can be compared over time.
+import argparse
+from datetime import datetime
+import json
+from pathlib import Path
+import subprocess
+import sys
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+from scipy import ndimage
+from skimage import filters
+from skimage.measure import label, regionprops_table
+
+DOCS = Path(__file__).resolve().parent.parent / 'docs'
+sys.path.insert(0, str(DOCS / 'ryan_savill' / '03_background_subtraction'))
+sys.path.insert(0, str(DOCS / 'ryan_savill' / 'principal_feature_analysis'))
+sys.path.insert(0, str(DOCS / 'marcelo_zoccoler' / 'entry_user_interf3' / 'scripts'))
+
+import image_analysis_functions as iaf
+from flood_engine import FloodEngine
+from label_measurements import measure_labels
+from pfa import PFA
+
+SIZES = (256, 512, 1024, 2048, 4096, 8192)
+STACK_SHAPES = ((16, 512, 512), (64, 1024, 1024))
+
+
+def make_image(shape, seed=0):
+    # bright blobs ("nuclei") on a smooth, uneven background, as uint16 like the tribolium data
+    rng = np.random.default_rng(seed)
+    image = np.zeros(shape, dtype=np.float32)
+    n_blobs = max(int(np.prod(shape) / 2000), 1)
+    image[tuple(rng.integers(0, n, n_blobs) for n in shape)] = 1000
+    image = ndimage.gaussian_filter(image, 3)
+    background = np.linspace(0, 500, shape[-1], dtype=np.float32)
+    return (image + background + rng.normal(100, 10, shape).astype(np.float32)).clip(0).astype(np.uint16)
+
+
+def make_table(n_objects, n_features=100, seed=0):
+    # correlated features, like regionprops measurements
+    rng = np.random.default_rng(seed)
+    return rng.normal(size=(n_objects, n_features // 4)) @ rng.normal(size=(n_features // 4, n_features))
+
+
+def diytophat(image, size=25):
+    minimum = ndimage.minimum_filter(image, size)
+    return image - ndimage.maximum_filter(minimum, size)
+
+
+def flood_original(image, delta):
+    new_level = delta*85
+    return (image <= new_level).astype(int)*13
+
+
+def flood_engine(image, delta):
+    # setup and one slider move, like the first interaction with the flood tool
+    return FloodEngine(image).flood(delta)
+
+
+# name: (function of the input, kind of input, largest 2D size it is run on by default)
+RECIPES = {
+    'subtract_background': (lambda image: iaf.subtract_background(image, 50), '2d', 1024),
+    'fast_subtract_background': (lambda image: iaf.fast_subtract_background(image, 50), '2d', 8192),
+    'fast_subtract_background_stack': (lambda image: iaf.fast_subtract_background(image, 50), '3d', None),
+    'tiled_subtract_background_stack': (lambda image: iaf.tiled_subtract_background(
+        image, 50, method=iaf.fast_subtract_background), '3d', None),
+    'diy_tophat': (diytophat, '2d', 8192),
+    'difference_of_gaussians': (lambda image: filters.difference_of_gaussians(image, 1, 100), '2d', 4096),
+    'subtract_background_dog': (lambda image: iaf.subtract_background_dog(image, 1, 100), '2d', 8192),
+    'subtract_background_dog_stack': (lambda image: iaf.subtract_background_dog_batch(image, 1, 100), '3d', None),
+    'flood_original': (lambda image: flood_original(image // 256, 1.5), '2d', 8192),
+    'flood_engine': (lambda image: flood_engine(image // 256, 1.5), '2d', 8192),
+    'median_and_otsutresh': (lambda image: iaf.median_and_otsutresh((image // 4).astype(np.uint8), 25), '2d', 2048),
+    'threshold': (lambda image: image > 300, '2d', 8192),
+    'regionprops_table': (lambda image: regionprops_table(
+        label(image > 300), image, properties=('area', 'bbox', 'centroid', 'intensity_mean')), '2d', 2048),
+    'measure_labels': (lambda image: measure_labels(label(image > 300), image), '2d', 8192),
+    'pfa_fit': (lambda table: PFA(random_state=0).fit(table), 'table', None),
+}
+
+
+def measure(function, data, repeat):
+    # best wall time of `repeat` runs, and the peak of memory allocated during one run
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function(data)
+        times.append(perf_counter() - start)
+
+    tracemalloc.start()
+    function(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+
+def inputs(kind, sizes, max_size):
+    if kind == '2d':
+        for size in sizes:
+            if max_size is None or size <= max_size:
+                yield '{0}x{0}'.format(size), make_image((size, size))
+    elif kind == '3d':
+        for shape in STACK_SHAPES:
+            yield 'x'.join(map(str, shape)), make_image(shape)
+    else:
+        for n_objects in (10**4, 10**5):
+            yield '{}x100'.format(n_objects), make_table(n_objects)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=DOCS, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the image processing recipes of the blog.')
+    parser.add_argument('--recipes', nargs='+', choices=RECIPES, default=list(RECIPES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES, help='edge lengths of the 2D images')
+    parser.add_argument('--all-sizes', action='store_true', help='also run slow recipes on large images')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='benchmark_results.jsonl')
+    args = parser.parse_args()
+
+    run = {'date': datetime.now().isoformat(timespec='seconds'), 'commit': git_commit()}
+    print('{:<32} {:<16} {:>10} {:>14}'.format('recipe', 'input', 'time (s)', 'peak memory (MB)'))
+    with open(args.output, 'a') as output:
+        for name in args.recipes:
+            function, kind, max_size = RECIPES[name]
+            for input_name, data in inputs(kind, args.sizes, None if args.all_sizes else max_size):
+                seconds, peak = measure(function, data, args.repeat)
+                print('{:<32} {:<16} {:>10.4f} {:>14.1f}'.format(name, input_name, seconds, peak / 1e6))
+                output.write(json.dumps({**run, 'recipe': name, 'input': input_name,
+                                         'seconds': seconds, 'peak_bytes': peak}) + '\n')
@@ -0,0 +1,115 @@
+# Files per second and peak memory of the segmentation from the introduction to
+# scikit-image (subtract_background -> median_and_otsutresh -> measure.label) on a
+# batch of synthetic TIFF files:
+#
+#   loop            the functions called one after the other for every file
+#   cold            segmentation_pipeline on an empty cache, in parallel processes
+#   median changed  the same pipeline with another median size (background is cached)
+#   warm            everything cached
+#
+#   python benchmarks/benchmark_segmentation_pipeline.py --files 32 --size 1024 --workers 4
+import argparse
+import json
+from pathlib import Path
+import resource
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+import numpy as np
+from scipy import ndimage
+from skimage import measure
+import tifffile
+
+DOCS = Path(__file__).resolve().parent.parent / 'docs'
+sys.path.insert(0, str(DOCS / 'ryan_savill' / '03_background_subtraction'))
+
+import image_analysis_functions as iaf
+from segmentation_pipeline import segmentation_pipeline
+
+
+def make_files(folder, n_files, size):
+    # blurred random spots on a smooth background, one file per seed
+    files = []
+    for seed in range(n_files):
+        rng = np.random.default_rng(seed)
+        image = np.zeros((size, size))
+        spots = rng.integers(0, size, (size // 8, 2))
+        image[spots[:, 0], spots[:, 1]] = 4000
+        image = ndimage.gaussian_filter(image, 3) + np.linspace(0, 200, size)[None, :]
+        path = Path(folder) / 'image_{:03d}.tif'.format(seed)
+        tifffile.imwrite(path, image.astype(np.uint16))
+        files.append(path)
+    return files
+
+
+def segment(path):
+    image = tifffile.imread(path)
+    return measure.label(iaf.median_and_otsutresh(iaf.subtract_background(image, 15), 1))
+
+
+def peak_rss_mb():
+    # ru_maxrss is the peak of the whole process lifetime, in kilobytes on Linux and in
+    # bytes on macOS; the children are the worker processes
+    unit = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own * unit / 2**20, children * unit / 2**20
+
+
+def run_scenario(name, folder, n_workers):
+    # seconds for one scenario. The scenarios run in the order of SCENARIOS and share
+    # the cache: cold fills it for median size 1, median changed adds median size 3
+    # and warm finds everything.
+    files = sorted(Path(folder).glob('image_*.tif'))
+    if name == 'loop':
+        start = perf_counter()
+        for path in files:
+            segment(path)
+        return perf_counter() - start
+
+    pipeline = segmentation_pipeline(radius=15, mediansize=1 if name == 'cold' else 3,
+                                     cache_dir=Path(folder) / 'cache')
+    start = perf_counter()
+    pipeline.run_batch(files, n_workers=n_workers)
+    return perf_counter() - start
+
+
+SCENARIOS = ('loop', 'cold', 'median changed', 'warm')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cached segmentation pipeline.')
+    parser.add_argument('--files', type=int, default=16)
+    parser.add_argument('--size', type=int, default=1024)
+    parser.add_argument('--workers', type=int, default=None)
+    # used by the benchmark itself: run one scenario on the files in folder
+    parser.add_argument('--scenario', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--folder', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        seconds = run_scenario(args.scenario, args.folder, args.workers)
+        print(json.dumps([seconds, *peak_rss_mb()]))
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        files = make_files(folder, args.files, args.size)
+        print('{:<16} {:>10} {:>20} {:>20}'.format(
+            'run', 'files/s', 'peak RSS main (MB)', 'peak RSS workers (MB)'))
+
+        # every scenario runs in a fresh process, so that the peak memory is its own
+        # and not the largest one of all scenarios so far
+        for name in SCENARIOS:
+            command = [sys.executable, __file__, '--scenario', name, '--folder', folder]
+            if args.workers is not None:
+                command += ['--workers', str(args.workers)]
+            output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+            seconds, own, children = json.loads(output.splitlines()[-1])
+            print('{:<16} {:>10.2f} {:>20.1f} {:>20.1f}'.format(
+                name, len(files) / seconds, own, children))
+
+
+if __name__ == '__main__':
+    main()
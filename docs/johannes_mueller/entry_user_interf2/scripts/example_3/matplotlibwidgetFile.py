@@ -11,6 +11,8 @@ from matplotlib.backends.backend_qt5 import NavigationToolbar2QT as NavigationTo
 
 from matplotlib.figure import Figure
 
+from PyQt5.QtCore import QTimer
+from PyQt5.QtGui import QGuiApplication
 from PyQt5.QtWidgets import QSizePolicy
 from PyQt5.QtWidgets import QVBoxLayout
 from PyQt5.QtWidgets import QWidget
@@ -18,9 +20,28 @@ from PyQt5.QtWidgets import QWidget
 import numpy as np
 
 
+def minmax_decimate(x, y, n_bins):
+    """
+    Reduces a long series to the minimum and maximum of n_bins equally long
+    pieces, so a line plot looks the same with far fewer points. x has to be
+    sorted.
+    """
+    if len(y) <= 2 * n_bins:
+        return x, y
+    starts = np.linspace(0, len(y), n_bins + 1).astype(int)[:-1]
+    minima = np.minimum.reduceat(y, starts)
+    maxima = np.maximum.reduceat(y, starts)
+    return np.repeat(x[starts], 2), np.column_stack([minima, maxima]).ravel()
+
+
 class MplCanvas(FigureCanvas):
     """
     Defines the canvas of the matplotlib window
+
+    For live plots use update_line/update_histogram instead of clearing and
+    plotting again: the lines are reused, only they are redrawn on top of a
+    saved background (blitting), long series are reduced to the pixel width
+    of the axes and redraws happen at most as often as the screen refreshes.
     """
 
     def __init__(self):
@@ -32,6 +53,64 @@ class MplCanvas(FigureCanvas):
                                    QSizePolicy.Expanding)
         FigureCanvas.updateGeometry(self)
 
+        self.lines = {}                             # reused line artists by name
+        self.background = None                     # everything except the lines
+        self.mpl_connect('draw_event', self.save_background)
+
+        # redraw at most once per frame of the screen
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 60
+        self.redraw_timer = QTimer()
+        self.redraw_timer.setSingleShot(True)
+        self.redraw_timer.setInterval(int(1000 / refresh_rate))
+        self.redraw_timer.timeout.connect(self.blit_lines)
+        self.full_redraw = False
+
+    def update_line(self, name, x, y, autoscale=False, **kwargs):
+        """
+        Shows y over x as the line called name. The first call creates the
+        line (kwargs are passed to axes.plot), later calls only replace its
+        data. With autoscale=True the axes limits follow the data, which
+        needs a full redraw instead of blitting.
+        """
+        x, y = minmax_decimate(np.asarray(x), np.asarray(y), max(int(self.axes.bbox.width), 1))
+        if name not in self.lines:
+            self.lines[name], = self.axes.plot(x, y, animated=True, **kwargs)
+            self.full_redraw = True
+        else:
+            self.lines[name].set_data(x, y)
+        if autoscale:
+            self.axes.relim()
+            self.axes.autoscale_view()
+            self.full_redraw = True
+        self.request_redraw()
+
+    def update_histogram(self, name, counts, bin_edges, **kwargs):
+        """
+        Shows a histogram as a step line, so it can be updated like any other line.
+        """
+        counts = np.append(counts, counts[-1:])     # the last bin ends at the last edge
+        self.update_line(name, bin_edges, counts, drawstyle='steps-post', **kwargs)
+
+    def request_redraw(self):
+        if not self.redraw_timer.isActive():
+            self.redraw_timer.start()
+
+    def save_background(self, event=None):
+        self.background = self.copy_from_bbox(self.axes.bbox)
+        for line in self.lines.values():
+            self.axes.draw_artist(line)
+
+    def blit_lines(self):
+        if self.full_redraw or self.background is None:
+            self.full_redraw = False
+            self.draw_idle()                        # draws everything and saves a new background
+            return
+        self.restore_region(self.background)
+        for line in self.lines.values():
+            self.axes.draw_artist(line)
+        self.blit(self.axes.bbox)
+
 class matplotlibWidget(QWidget):
     """
     The matplotlibWidget class based on QWidget
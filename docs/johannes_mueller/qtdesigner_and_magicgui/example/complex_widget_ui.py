@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation of 'complex_widget.ui', laid out like the output of
+#     pyuic5 complex_widget.ui -o complex_widget_ui.py
+# but importing qtpy instead of PyQt5, so it works with every Qt binding napari supports.
+# Regenerate it whenever complex_widget.ui changes.
+
+from qtpy import QtCore, QtWidgets
+
+
+class Ui_Form(object):
+    def setupUi(self, Form):
+        Form.setObjectName("Form")
+        Form.resize(400, 212)
+        self.verticalLayout = QtWidgets.QVBoxLayout(Form)
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.magicgui_placeholder = QtWidgets.QWidget(Form)
+        self.magicgui_placeholder.setObjectName("magicgui_placeholder")
+        self.verticalLayout.addWidget(self.magicgui_placeholder)
+        self.tabWidget = QtWidgets.QTabWidget(Form)
+        self.tabWidget.setObjectName("tabWidget")
+        self.tab = QtWidgets.QWidget()
+        self.tab.setObjectName("tab")
+        self.gridLayout = QtWidgets.QGridLayout(self.tab)
+        self.gridLayout.setObjectName("gridLayout")
+        self.pushButton = QtWidgets.QPushButton(self.tab)
+        self.pushButton.setObjectName("pushButton")
+        self.gridLayout.addWidget(self.pushButton, 1, 0, 1, 2)
+        self.doubleSpinBox = QtWidgets.QDoubleSpinBox(self.tab)
+        self.doubleSpinBox.setObjectName("doubleSpinBox")
+        self.gridLayout.addWidget(self.doubleSpinBox, 0, 1, 1, 1)
+        self.horizontal_slider_widget = QtWidgets.QSlider(self.tab)
+        self.horizontal_slider_widget.setOrientation(QtCore.Qt.Horizontal)
+        self.horizontal_slider_widget.setObjectName("horizontal_slider_widget")
+        self.gridLayout.addWidget(self.horizontal_slider_widget, 0, 0, 1, 1)
+        spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.gridLayout.addItem(spacerItem, 2, 0, 1, 1)
+        self.tabWidget.addTab(self.tab, "")
+        self.tab_2 = QtWidgets.QWidget()
+        self.tab_2.setObjectName("tab_2")
+        self.label = QtWidgets.QLabel(self.tab_2)
+        self.label.setGeometry(QtCore.QRect(30, 40, 47, 14))
+        self.label.setObjectName("label")
+        self.tabWidget.addTab(self.tab_2, "")
+        self.verticalLayout.addWidget(self.tabWidget)
+        spacerItem1 = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.verticalLayout.addItem(spacerItem1)
+
+        self.retranslateUi(Form)
+        self.tabWidget.setCurrentIndex(0)
+        QtCore.QMetaObject.connectSlotsByName(Form)
+
+    def retranslateUi(self, Form):
+        _translate = QtCore.QCoreApplication.translate
+        Form.setWindowTitle(_translate("Form", "Form"))
+        self.pushButton.setText(_translate("Form", "PushButton"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab), _translate("Form", "Tab 1"))
+        self.label.setText(_translate("Form", "TextLabel"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.tab_2), _translate("Form", "Tab 2"))
@@ -1,18 +1,36 @@
 from qtpy.QtWidgets import QWidget
 from qtpy.QtCore import QEvent, QObject
-from qtpy import uic
+import os
+import sys
 from pathlib import Path
+# helper modules that are also used by the entry_user_interf3 (flood tool) post are in docs/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'shared'))
 
-from magicgui.widgets import create_widget
-from napari.layers import Image
+import numpy as np
 
+from complex_widget_ui import Ui_Form   # complex_widget.ui compiled to python, faster than uic.loadUi
+from pyramid_preview import PyramidPreview
+from widget_profiler import enable_profiling, measure, profiled, redraw_pending
 
-class my_custom_widget(QWidget):
+
+def threshold(image, value, out):
+    # writes into an existing array instead of allocating a new one
+    return np.greater(image, value, out=out)
+
+
+class my_custom_widget(QWidget, Ui_Form):
     def __init__(self, napari_viewer):
+        # magicgui and napari are only imported when the widget is created, so that
+        # importing this module (e.g. when napari lists its plugins) stays fast
+        from magicgui.widgets import create_widget
+        from napari.layers import Image
+
         super().__init__()
 
         self.viewer = napari_viewer
-        uic.loadUi(Path(__file__).parent / "./complex_widget.ui", self)
+        if os.environ.get('PROFILE_WIDGETS'):   # opt-in timing of the widget callbacks
+            enable_profiling(napari_viewer)
+        self.setupUi(self)
 
         # add magicgui widget to widget layout
         self.image_layer_select = create_widget(annotation=Image,
@@ -20,8 +38,18 @@ class my_custom_widget(QWidget):
         self.layout().insertWidget(0, self.image_layer_select.native)
         self.installEventFilter(self)
 
+        # thresholding runs in a background thread, only the newest result is shown;
+        # while the slider is dragged, a downsampled image is thresholded
+        self.threshold_preview = PyramidPreview(profiled(self.threshold_level, 'my_custom_widget'),
+                                                self.show_result)
+        # one reused result per image size, with the image and the value it was
+        # thresholded with
+        self.result_buffers = {}
+        self.result_states = {}
+
         # connect slider to function
         self.horizontal_slider_widget.valueChanged.connect(self.on_slider_change)
+        self.horizontal_slider_widget.sliderReleased.connect(self.on_slider_change)
 
     def eventFilter(self, obj: QObject, event: QEvent):
         if event.type() == QEvent.ParentChange:
@@ -31,11 +59,53 @@ class my_custom_widget(QWidget):
 
     def on_slider_change(self):
         image_layer = self.image_layer_select.value
-        binary_image = image_layer.data > self.horizontal_slider_widget.value()
-
-        if 'result of threshold' not in self.viewer.layers:
-            self.viewer.add_image(binary_image,
-                                  name='result of threshold',
-                                  opacity=0.5)
-        else: 
-            self.viewer.layers['result of threshold'].data = binary_image
\ No newline at end of file
+
+        # full resolution only when the slider is not dragged anymore
+        self.threshold_preview.update(image_layer.data,
+                                      self.horizontal_slider_widget.value(),
+                                      final=not self.horizontal_slider_widget.isSliderDown(),
+                                      scale=image_layer.scale, rgb=image_layer.rgb)
+
+    def threshold_level(self, image, value):
+        # runs in the worker: only finds the pixels that change, they are written in
+        # show_result (main thread), so the layer never shows a half-written result.
+        # From one value to the next, only the pixels between both values change.
+        state = self.result_states.get(image.shape)
+        if state is None or state[0] is not image:
+            return(image, value, None, np.greater(image, value))   # a new image, everything changes
+        previous = state[1]
+        changed = np.flatnonzero((image > min(previous, value)) & (image <= max(previous, value)))
+        return(image, value, previous, changed)
+
+    def show_result(self, result, scale):
+        image, value, previous, changed = result
+        buffer = self.result_buffers.get(image.shape)
+        state = self.result_states.get(image.shape)
+        with measure('my_custom_widget', 'write result'):
+            if buffer is None:
+                # only allocate a result for an image size that we haven't seen yet
+                buffer = self.result_buffers[image.shape] = changed
+            elif previous is None:
+                buffer[...] = changed
+            elif state[0] is not image or state[1] != previous:
+                threshold(image, value, buffer)     # the buffer changed after the pixels were found
+            else:
+                buffer.reshape(-1)[changed] = value < previous
+            self.result_states[image.shape] = (image, value)
+
+        with measure('my_custom_widget', 'layer assignment'):
+            if 'result of threshold' not in self.viewer.layers:
+                self.viewer.add_image(buffer,
+                                      name='result of threshold',
+                                      opacity=0.5,
+                                      scale=scale)
+            elif self.viewer.layers['result of threshold'].data is buffer:
+                # written in place; napari redraws image layers as a whole, but only
+                # when a pixel changed
+                if previous is None or len(changed):
+                    self.viewer.layers['result of threshold'].refresh()
+            else:
+                # switched between preview and full resolution
+                self.viewer.layers['result of threshold'].data = buffer
+                self.viewer.layers['result of threshold'].scale = scale
+        redraw_pending('my_custom_widget')
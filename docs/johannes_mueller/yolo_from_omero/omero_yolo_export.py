@@ -0,0 +1,117 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import os
+import threading
+
+import ezomero
+from skimage import io
+from sklearn.model_selection import train_test_split
+
+SPLITS = ('train', 'val', 'test')
+DONE_FILE = 'exported_image_ids.txt'
+
+
+def split_image_ids(img_ids, random_state=42):
+    # the same 70/20/10% train/val/test split as in the notebook, but decided before
+    # downloading, so that every file can be written directly into its folder
+    train_ids, test_ids = train_test_split(list(img_ids), test_size=0.30, random_state=random_state)
+    val_ids, test_ids = train_test_split(test_ids, test_size=1/3, random_state=random_state)  # 1/3 of 30% => 10%
+    return {**{i: 'train' for i in train_ids}, **{i: 'val' for i in val_ids}, **{i: 'test' for i in test_ids}}
+
+
+def shapes_to_yolo(shapes, width, height, object_classes):
+    # OMERO rectangles (top left corner, pixels) to YOLO lines (center, relative to the image)
+    lines = []
+    for shape in shapes:
+        w = shape.width / width
+        h = shape.height / height
+
+        x = shape.x / width + w / 2
+        y = shape.y / height + h / 2
+
+        class_id = object_classes[shape.label]
+
+        lines.append(f'{class_id} {x} {y} {w} {h}\n')
+    return ''.join(lines)
+
+
+def export_image(conn, img_id, split, working_directory, object_classes):
+    # download one image and its rois and write them into the folders of their split
+    metadata, image = ezomero.get_image(conn, image_id=img_id, dim_order='tczyx')
+    image = image.squeeze()  # remove singleton dimensions (TCZ)
+    width, height = image.shape[1], image.shape[0]
+
+    shapes = []
+    for roi_id in ezomero.get_roi_ids(conn, image_id=img_id):
+        for shape_id in ezomero.get_shape_ids(conn, roi_id=roi_id):
+            shapes.append(ezomero.get_shape(conn, shape_id=shape_id))
+
+    image_filename = os.path.join(working_directory, split, 'images', f'{metadata.name}.png')
+    labels_filename = os.path.join(working_directory, split, 'labels', f'{metadata.name}.txt')
+
+    # write to temporary files and rename them, so an interruption never leaves half files
+    io.imsave(image_filename + '.part.png', image, check_contrast=False)
+    os.replace(image_filename + '.part.png', image_filename)
+    with open(labels_filename + '.part', 'w') as f:
+        f.write(shapes_to_yolo(shapes, width, height, object_classes))
+    os.replace(labels_filename + '.part', labels_filename)
+
+
+def export_dataset(conn, dataset_id, working_directory, object_classes, max_workers=8,
+                   connect=None, random_state=42, progress=None):
+    # Exports a whole OMERO dataset into the train/val/test folders YOLO expects.
+    # Downloading, converting the rois and writing the PNGs of up to max_workers images
+    # happen at the same time. The IDs of finished images are appended to DONE_FILE, so
+    # calling this again after an interruption continues where it stopped.
+    # connect: function that opens a new connection, one is used per thread. A
+    # BlitzGateway can't be used by several threads at the same time, so without
+    # connect the images are exported one after the other with conn.
+    # progress: optional function that is called with the image ID of every finished image.
+    if connect is None:
+        max_workers = 1
+    img_ids = ezomero.get_image_ids(conn, dataset=dataset_id)
+    splits = split_image_ids(img_ids, random_state=random_state)
+
+    for split in SPLITS:
+        os.makedirs(os.path.join(working_directory, split, 'images'), exist_ok=True)
+        os.makedirs(os.path.join(working_directory, split, 'labels'), exist_ok=True)
+
+    done_filename = os.path.join(working_directory, DONE_FILE)
+    done = set()
+    if os.path.exists(done_filename):
+        with open(done_filename) as f:
+            done = {int(line) for line in f if line.strip()}
+    todo = [img_id for img_id in img_ids if img_id not in done]
+
+    thread_connections = threading.local()
+
+    def export(img_id):
+        if connect is None:
+            thread_conn = conn
+        else:
+            if not hasattr(thread_connections, 'conn'):
+                thread_connections.conn = connect()
+            thread_conn = thread_connections.conn
+        export_image(thread_conn, img_id, splits[img_id], working_directory, object_classes)
+        return img_id
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, open(done_filename, 'a') as done_file:
+        # only keep a few more images in flight than there are workers, so memory
+        # doesn't grow with the size of the dataset
+        running = set()
+        for img_id in todo:
+            running.add(pool.submit(export, img_id))
+            if len(running) >= 2 * max_workers:
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                _mark_done(finished, done_file, progress)
+        _mark_done(wait(running).done, done_file, progress)
+
+    return splits
+
+
+def _mark_done(futures, done_file, progress):
+    for future in futures:
+        img_id = future.result()  # raises the exception of a failed export
+        done_file.write(f'{img_id}\n')
+        done_file.flush()
+        if progress is not None:
+            progress(img_id)
@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import sys
+import threading
+from time import perf_counter
+
+import ezomero
+import numpy as np
+import torch
+from skimage import io
+
+
+def batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def predict(model, image_files, batch_size=32):
+    # Runs the model on the CPU on batch_size images at a time and yields, for every
+    # image, the file name, the boxes (x, y, width, height of the top left corner in
+    # pixels, like OMERO wants them) and the class IDs as numpy arrays.
+    for batch in batches(image_files, batch_size):
+        results = model(batch, device='cpu', verbose=False)
+
+        # move the boxes of the whole batch to numpy in one step instead of box by box
+        counts = [len(result.boxes) for result in results]
+        xywh = torch.cat([result.boxes.xywh for result in results]).detach().cpu().numpy()
+        classes = torch.cat([result.boxes.cls for result in results]).detach().cpu().numpy().astype(int)
+
+        # YOLO boxes are anchored at their center, OMERO boxes at the top left corner
+        corners = xywh.copy()
+        corners[:, :2] -= xywh[:, 2:] / 2
+
+        split_at = np.cumsum(counts)[:-1]
+        for image_file, boxes, box_classes in zip(batch, np.split(corners, split_at), np.split(classes, split_at)):
+            yield image_file, boxes, box_classes
+
+
+def boxes_to_rectangles(boxes, classes, class_names):
+    return [ezomero.rois.Rectangle(x, y, width, height, label=class_names[class_id])
+            for (x, y, width, height), class_id in zip(boxes.tolist(), classes.tolist())]
+
+
+def upload_prediction(conn, image_file, boxes, classes, class_names, dataset_id):
+    # one image and one roi that contains all of its boxes
+    image = io.imread(image_file)
+    image_id = ezomero.post_image(
+        conn, image=image[None, None, None, :], dim_order='tczyx',
+        dataset_id=dataset_id,
+        image_name=os.path.splitext(os.path.basename(image_file))[0]
+        )
+    rectangles = boxes_to_rectangles(boxes, classes, class_names)
+    roi_id = ezomero.post_roi(conn, image_id=image_id, shapes=rectangles) if rectangles else None
+    return image_id, roi_id
+
+
+def predict_and_upload(conn, model, image_files, class_names, dataset_id, batch_size=32, max_workers=4,
+                       connect=None):
+    # While the model predicts the next batch, the finished images and their rois are
+    # uploaded by at most max_workers threads. Returns (image ID, roi ID) for every file.
+    # connect: function that opens a new connection, one is used per thread. A
+    # BlitzGateway can't be used by several threads at the same time, so without
+    # connect the images are uploaded one after the other with conn.
+    if connect is None:
+        max_workers = 1
+    thread_connections = threading.local()
+
+    def upload(image_file, boxes, classes):
+        if connect is None:
+            thread_conn = conn
+        else:
+            if not hasattr(thread_connections, 'conn'):
+                thread_connections.conn = connect()
+            thread_conn = thread_connections.conn
+        return upload_prediction(thread_conn, image_file, boxes, classes, class_names, dataset_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        uploads = [pool.submit(upload, image_file, boxes, classes)
+                   for image_file, boxes, classes in predict(model, image_files, batch_size)]
+        return [upload.result() for upload in uploads]
+
+
+def throughput(model, image_files, batch_size):
+    # images per second for inference and conversion of the boxes, without uploading
+    start = perf_counter()
+    for _ in predict(model, image_files, batch_size):
+        pass
+    return len(image_files) / (perf_counter() - start)
+
+
+if __name__ == '__main__':
+    # python omero_yolo_predict.py path/to/best.pt path/to/test/images
+    from ultralytics import YOLO
+
+    model = YOLO(sys.argv[1])
+    image_folder = sys.argv[2]
+    image_files = sorted(os.path.join(image_folder, f) for f in os.listdir(image_folder))
+
+    throughput(model, image_files[:8], 8)  # warm up
+    for batch_size in (1, 8, 32, 64):
+        print(f'batch size {batch_size:>3}: {throughput(model, image_files, batch_size):.1f} images/s')
@@ -1,22 +1,21 @@
+import os
+import sys
+from pathlib import Path
+# helper modules that are also used by the qtdesigner_and_magicgui post are in docs/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'shared'))
 import napari
 from skimage.io import imread
 from qtpy.QtWidgets import QMainWindow
-from qtpy import uic
-from pathlib import Path
-
-def flood(image, delta):
-    new_level = delta*85
-    label_image = image <= new_level
-    label_image = label_image.astype(int)*13  # label 13 is blue in napari
-    return(label_image, new_level)
+from flood_tool_ui import Ui_MainWindow      # flood_tool.ui compiled to python, faster than uic.loadUi
+from flood_engine import get_flood_engine, write_to_layer
+from widget_profiler import enable_profiling, measure, redraw_pending
 
 # Define the main window class
-class FancyGUI(QMainWindow):
+class FancyGUI(QMainWindow, Ui_MainWindow):
     def __init__(self, napari_viewer):          # include napari_viewer as argument (it has to have this name)
         super().__init__()
         self.viewer = napari_viewer
-        self.UI_FILE = str(Path(__file__).parent / "flood_tool.ui")  # path to .ui file
-        uic.loadUi(self.UI_FILE, self)           # load QtDesigner .ui file
+        self.setupUi(self)                       # build the GUI designed in QtDesigner
 
         self.label_layer = None                # stored label layer variable
         self.pushButton.clicked.connect(self.apply_delta)
@@ -24,14 +23,21 @@ class FancyGUI(QMainWindow):
     def apply_delta(self):
         image = self.viewer.layers['napari_island'].data    # We chose to use the layer name to find the correct image layer
         delta = self.doubleSpinBox.value()
-        label, level = flood(image, delta)
-        if self.label_layer is None:
-            self.label_layer = self.viewer.add_labels(label)
-        else:
-            self.label_layer.data = label
-        self.horizontalSlider.setValue(level)
+        with measure('FancyGUI', 'compute'):
+            changes = get_flood_engine(image).flood_changes(delta)   # sorts the image once, then only finds changed pixels
+        with measure('FancyGUI', 'layer assignment'):
+            if self.label_layer is None:
+                self.label_layer = self.viewer.add_labels(changes.apply())
+            elif self.label_layer.data is changes.engine.label_image:
+                write_to_layer(changes, self.label_layer)   # writes in place and redraws only the changed pixels
+            else:
+                self.label_layer.data = changes.apply()     # another image was flooded
+        redraw_pending('FancyGUI')
+        self.horizontalSlider.setValue(changes.new_level)
 
 viewer = napari.Viewer()
+if os.environ.get('PROFILE_WIDGETS'):                                      # opt-in timing of the widget callbacks
+    enable_profiling(viewer)
 napari_image = imread('../images/21_Map_of_Tabuaeran_Kiribati_blue.png')    # Reads an image from file
 viewer.add_image(napari_image, name='napari_island')                       # Adds the image to the viewer and give the image layer a name
 
@@ -0,0 +1,48 @@
+# Measures how long one interaction (one new spinbox/slider value) takes for the flood
+# and the threshold at every level of an image pyramid, without opening napari.
+# Run it from this folder: python benchmark_pyramid_preview.py
+from time import perf_counter
+import sys
+from pathlib import Path
+# helper modules that are also used by the qtdesigner_and_magicgui post are in docs/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'shared'))
+
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+from flood_engine import FloodEngine
+from pyramid_preview import build_pyramid
+
+def make_island(size=8192, seed=0):
+    # smooth random terrain with values from 0 to 255, like the map of Tabuaeran
+    rng = np.random.default_rng(seed)
+    terrain = gaussian_filter(rng.random((size // 16, size // 16)), 4)
+    terrain = np.kron(terrain, np.ones((16, 16)))
+    terrain = (terrain - terrain.min()) / np.ptp(terrain) * 255
+    return terrain.astype(np.uint8)
+
+def frame_time(function, values):
+    # median time in ms it takes to compute one value
+    times = []
+    for value in values:
+        start = perf_counter()
+        function(value)
+        times.append((perf_counter() - start) * 1000)
+    return np.median(times)
+
+if __name__ == '__main__':
+    image = make_island()
+    deltas = np.linspace(0, 3, 31)             # the values of the temperature spinbox
+    deltas = np.concatenate([deltas, deltas[::-1]])  # drag up and down again
+
+    print('level  shape          flood (ms)  threshold (ms)  engine setup (ms)')
+    for level, data in enumerate(build_pyramid(image)):
+        start = perf_counter()
+        engine = FloodEngine(data)
+        setup = (perf_counter() - start) * 1000
+
+        buffer = np.zeros(data.shape, dtype=bool)
+        flood_ms = frame_time(engine.flood, deltas)
+        threshold_ms = frame_time(lambda delta: np.greater(data, delta*85, out=buffer), deltas)
+        print('{:<6} {:<14} {:>10.2f}  {:>14.2f}  {:>17.1f}'.format(
+            level, '{}x{}'.format(*data.shape), flood_ms, threshold_ms, setup))
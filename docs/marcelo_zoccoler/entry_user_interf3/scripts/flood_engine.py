@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class FloodEngine:
+    # Floods an image for many sea levels without touching the whole image every time.
+    # The pixels are sorted by height once. For a new level, only the pixels between
+    # the old and the new level are written into one label image that is reused, so
+    # dragging the temperature spinbox doesn't create new full-size arrays.
+    #
+    # Finding the pixels (flood_changes) doesn't write anything and can run in a
+    # background thread while label_image is on screen; the changes are applied in
+    # the main thread, e.g. by the napari layer that shows label_image, which then
+    # only redraws the changed region (write_to_layer).
+    def __init__(self, image, label=13):          # label 13 is blue in napari
+        flat_image = np.asarray(image).ravel()
+        index_type = np.uint32 if flat_image.size < 2**32 else np.intp
+
+        self.image = image
+        self.label = label
+        self.order = np.argsort(flat_image, kind='stable').astype(index_type)  # pixels from low to high
+        self.sorted_heights = flat_image[self.order]
+        self.label_image = np.zeros(np.shape(image), dtype=np.uint8)  # reused output
+        self.n_flooded = 0                          # number of pixels below the level of label_image
+
+    def flood(self, delta):
+        # flood label_image to the level of delta right away, for the main thread
+        changes = self.flood_changes(delta)
+        return(changes.apply(), changes.new_level)
+
+    def flood_changes(self, delta):
+        # the pixels that change when label_image is flooded to the level of delta
+        new_level = delta*85
+        n_flooded = int(np.searchsorted(self.sorted_heights, new_level, side='right'))
+        changed, value = self._changes(self.n_flooded, n_flooded)
+        return FloodChanges(self, changed, value, new_level, self.n_flooded, n_flooded)
+
+    def _apply(self, changes, write=None):
+        changed, value = changes.changed, changes.value
+        if changes.n_flooded_before != self.n_flooded:
+            # label_image changed after the changes were found; the pixels to write
+            # are just another slice of the sorted pixels
+            changed, value = self._changes(self.n_flooded, changes.n_flooded)
+        if write is None:
+            self.label_image.reshape(-1)[changed] = value   # label_image is contiguous, this is a view
+        else:
+            write(np.unravel_index(changed, self.label_image.shape), value)
+        self.n_flooded = changes.n_flooded
+        return self.label_image
+
+    def _changes(self, n_flooded_before, n_flooded):
+        # the pixels to write (as flat indices) and their label
+        if n_flooded >= n_flooded_before:
+            return(self.order[n_flooded_before:n_flooded], self.label)
+        return(self.order[n_flooded:n_flooded_before], 0)
+
+
+class FloodChanges:
+    # the result of FloodEngine.flood_changes: which pixels of the engine's label_image
+    # change (flat indices), their new label and the new sea level
+    def __init__(self, engine, changed, value, new_level, n_flooded_before, n_flooded):
+        self.engine = engine
+        self.changed = changed
+        self.value = value
+        self.new_level = new_level
+        self.n_flooded_before = n_flooded_before
+        self.n_flooded = n_flooded
+
+    def apply(self, write=None):
+        # write the changes into the engine's label_image (in the main thread, after
+        # older changes) and return it. write(indices, value), e.g. a Labels layer's
+        # data_setitem, does the writing instead of numpy.
+        return self.engine._apply(self, write)
+
+
+def write_to_layer(changes, layer):
+    # apply changes to a napari Labels layer that shows their engine's label_image:
+    # the layer writes the pixels and redraws only the region that changed. The undo
+    # history is skipped on purpose: a flood is not a paint stroke, and undoing it
+    # would leave the layer out of step with the engine.
+    with layer.block_history():
+        return changes.apply(write=layer.data_setitem)
+
+
+_engines = {}
+
+def get_flood_engine(image):
+    # keep engines for the last few images that were flooded (e.g. the levels of an
+    # image pyramid); an engine is only built once for every image
+    key = id(image)
+    if key not in _engines or _engines[key].image is not image:
+        if len(_engines) >= 8:
+            del _engines[next(iter(_engines))]   # forget the oldest engine
+        _engines[key] = FloodEngine(image)
+    return _engines[key]
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation of 'flood_tool.ui', laid out like the output of
+#     pyuic5 flood_tool.ui -o flood_tool_ui.py
+# but importing qtpy instead of PyQt5, so it works with every Qt binding napari supports.
+# Regenerate it whenever flood_tool.ui changes.
+
+from qtpy import QtCore, QtGui, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(288, 76)
+        MainWindow.setMinimumSize(QtCore.QSize(288, 76))
+        MainWindow.setStyleSheet("")
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        self.centralwidget.setMinimumSize(QtCore.QSize(288, 76))
+        self.centralwidget.setObjectName("centralwidget")
+        self.gridLayout = QtWidgets.QGridLayout(self.centralwidget)
+        self.gridLayout.setObjectName("gridLayout")
+        spacerItem = QtWidgets.QSpacerItem(20, 40, QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Expanding)
+        self.gridLayout.addItem(spacerItem, 5, 2, 1, 1)
+        self.label_2 = QtWidgets.QLabel(self.centralwidget)
+        font = QtGui.QFont()
+        font.setBold(True)
+        font.setWeight(75)
+        self.label_2.setFont(font)
+        self.label_2.setObjectName("label_2")
+        self.gridLayout.addWidget(self.label_2, 2, 0, 1, 1)
+        self.horizontalSlider = QtWidgets.QSlider(self.centralwidget)
+        self.horizontalSlider.setEnabled(False)
+        self.horizontalSlider.setMinimumSize(QtCore.QSize(0, 14))
+        self.horizontalSlider.setStyleSheet("background-color : qlineargradient(spread:pad, x1:0, y1:0, x2:1, y2:0, stop:0 rgba(0, 0, 0, 255), stop:1 rgba(0, 0, 255, 255));\n"
+"")
+        self.horizontalSlider.setMinimum(0)
+        self.horizontalSlider.setMaximum(255)
+        self.horizontalSlider.setOrientation(QtCore.Qt.Horizontal)
+        self.horizontalSlider.setObjectName("horizontalSlider")
+        self.gridLayout.addWidget(self.horizontalSlider, 2, 1, 2, 3)
+        self.pushButton = QtWidgets.QPushButton(self.centralwidget)
+        self.pushButton.setMinimumSize(QtCore.QSize(30, 20))
+        self.pushButton.setStyleSheet("background-color: rgb(0, 0, 255);\n"
+"color: rgb(255, 255, 255);\n"
+"font: 75 12pt \"MS Shell Dlg 2\";\n"
+"border: 2px solid white;\n"
+"border-radius: 5px;")
+        self.pushButton.setObjectName("pushButton")
+        self.gridLayout.addWidget(self.pushButton, 4, 0, 1, 4)
+        self.doubleSpinBox = QtWidgets.QDoubleSpinBox(self.centralwidget)
+        self.doubleSpinBox.setMaximum(3.0)
+        self.doubleSpinBox.setSingleStep(0.1)
+        self.doubleSpinBox.setObjectName("doubleSpinBox")
+        self.gridLayout.addWidget(self.doubleSpinBox, 1, 3, 1, 1)
+        self.label = QtWidgets.QLabel(self.centralwidget)
+        font = QtGui.QFont()
+        font.setBold(True)
+        font.setWeight(75)
+        self.label.setFont(font)
+        self.label.setObjectName("label")
+        self.gridLayout.addWidget(self.label, 1, 0, 1, 2)
+        MainWindow.setCentralWidget(self.centralwidget)
+
+        self.retranslateUi(MainWindow)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "Flood Tool"))
+        self.label_2.setToolTip(_translate("MainWindow", "Represents current gray value"))
+        self.label_2.setText(_translate("MainWindow", "Sea Level (dm):"))
+        self.pushButton.setText(_translate("MainWindow", "Apply"))
+        self.label.setText(_translate("MainWindow", "Temperature (Δ°C)"))
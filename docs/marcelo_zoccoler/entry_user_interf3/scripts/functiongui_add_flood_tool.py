@@ -1,16 +1,22 @@
+import os
+import sys
+from pathlib import Path
+# helper modules that are also used by the qtdesigner_and_magicgui post are in docs/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'shared'))
 import napari
 from skimage.io import imread
-from napari.types import ImageData, LabelsData, LayerDataTuple
+from napari.types import ImageData
 from magicgui.widgets import FunctionGui
+from flood_engine import get_flood_engine, write_to_layer
+from pyramid_preview import PyramidPreview
+from widget_profiler import enable_profiling, measure, profiled, redraw_pending
 
-def flood(image: ImageData, delta: float=0, new_level: int=0) -> LayerDataTuple:
-    new_level = delta*85
-    label_image = image <= new_level
-    label_image = label_image.astype(int)*13 # label 13 is blue in napari
-    return((label_image, {'name': 'flood result','metadata': {'new_level':new_level}}))
+def flood(image: ImageData, delta: float=0, new_level: int=0):
+    # only finds the pixels that change, show_flood writes them into the label image
+    return(get_flood_engine(image).flood_changes(delta))
 
 class MyGui(FunctionGui):
-    def __init__(self):
+    def __init__(self, napari_viewer):
         super().__init__(
           flood,
           call_button=False,
@@ -23,16 +29,33 @@ class MyGui(FunctionGui):
                             {'label':'Sea Level (dm):', 'widget_type':'Slider',
                              'min': 0, 'max' : 255, 'enabled' : False}}
         )
+        self.viewer = napari_viewer
+        # Computes in a background thread, on a smaller image while the value is changing
+        self.flood_preview = PyramidPreview(profiled(flood, 'MyGui'), self.show_flood)
 
     def __call__(self):
-        label_image = super().__call__()
-        new_level = round(label_image[1]['metadata']['new_level'])
-        self.new_level.value = new_level
+        # auto_call calls this on every change, the flood itself is computed in the background
+        self.flood_preview.update(self.image.value, self.delta.value)
+
+    def show_flood(self, changes, scale):  # Runs in the main thread with the newest result only
+        name = 'flood result'
+        with measure('MyGui', 'layer assignment'):
+            if name not in self.viewer.layers:
+                self.viewer.add_labels(changes.apply(), name=name, scale=scale)
+            elif self.viewer.layers[name].data is changes.engine.label_image:
+                write_to_layer(changes, self.viewer.layers[name])  # writes in place and redraws only the changed pixels
+            else:
+                self.viewer.layers[name].data = changes.apply()  # switched between preview and full resolution
+                self.viewer.layers[name].scale = scale
+        redraw_pending('MyGui')
+        self.new_level.value = round(changes.new_level)
 
 
 napari_image = imread('../images/21_Map_of_Tabuaeran_Kiribati_blue.png')
 viewer = napari.Viewer()
+if os.environ.get('PROFILE_WIDGETS'):  # opt-in timing of the widget callbacks
+    enable_profiling(viewer)
 viewer.add_image(napari_image, name='napari_island')
 
-flood_widget = MyGui()
+flood_widget = MyGui(viewer)
 viewer.window.add_dock_widget(flood_widget, area='right')
\ No newline at end of file
@@ -1,13 +1,17 @@
+import sys
+from pathlib import Path
+# helper modules that are also used by the qtdesigner_and_magicgui post are in docs/shared
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'shared'))
 import napari
 from skimage.io import imread
 from magicgui import magicgui
-from napari.types import ImageData, LabelsData
+from napari.types import ImageData
+from flood_engine import get_flood_engine, write_to_layer
+from pyramid_preview import PyramidPreview
 
-def flood(image: ImageData, delta: float=0, new_level: int=0) -> LabelsData:
-    new_level = delta*85
-    label_image = image <= new_level
-    label_image = label_image.astype(int)*13 # label 13 is blue in napari
-    return(label_image)
+def flood(image: ImageData, delta: float=0, new_level: int=0):
+    # only finds the pixels that change, show_flood writes them into the label image
+    return(get_flood_engine(image).flood_changes(delta))
 
 viewer = napari.Viewer()
 napari_image = imread('../images/21_Map_of_Tabuaeran_Kiribati_blue.png')    # Reads an image from file
@@ -17,12 +21,29 @@ flood_widget = magicgui(flood, delta={'label': 'Temperature Increase (Δ°C):',
                                            'min': 0, 'max' : 3, 'step': 0.1},
                                 new_level={'label':'Sea Level (dm):', 'widget_type':'Slider',
                                            'min': 0, 'max' : 255, "enabled": False},
-                                auto_call=True)
+                                call_button=False)
+
+def show_flood(changes, scale):  # Runs in the main thread with the newest result only
+    if 'flood result' not in viewer.layers:
+        viewer.add_labels(changes.apply(), name='flood result', scale=scale)
+    elif viewer.layers['flood result'].data is changes.engine.label_image:
+        write_to_layer(changes, viewer.layers['flood result'])  # writes in place and redraws only the changed pixels
+    else:
+        viewer.layers['flood result'].data = changes.apply()  # switched between preview and full resolution
+        viewer.layers['flood result'].scale = scale
+
+# Computes the flood in a background thread, on a smaller image while the value is changing
+flood_preview = PyramidPreview(flood, show_flood)
 
 # Thalley Lambert contributed to the annotated function below
 @flood_widget.delta.changed.connect  # Connect a function to delta (spinbox widget)
 def update_level(delta: float):
     flood_widget.new_level.value = delta * 85  # Update slider when spinbox changes
+    flood_preview.update(flood_widget.image.value, delta)  # Instead of auto_call, which blocks the GUI
+
+@flood_widget.image.changed.connect  # Flood again when another image layer is picked
+def update_image(image):
+    flood_preview.update(flood_widget.image.value, flood_widget.delta.value)
 
 viewer.window.add_dock_widget(flood_widget, area='right')  # Add our gui instance to napari viewer
 
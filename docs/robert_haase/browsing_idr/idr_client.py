@@ -0,0 +1,100 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import tempfile
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from imageio.v3 import imread
+
+IDR_URL = "https://idr.openmicroscopy.org"
+PLATES_URL = "{base_url}/webclient/api/plates/?id={screen_id}"
+WELLS_IMAGES_URL = "{base_url}/webgateway/plate/{plate_id}/{field}/"
+THUMBNAIL_URL = "{base_url}/webclient/render_thumbnail/{image_id}/"
+IMAGE_URL = "{base_url}/webclient/render_image/{image_id}/"
+
+
+class IDRClient:
+    # Downloads plates, wells, thumbnails and images from the IDR (or a local Omero).
+    # All requests go through one session that keeps its connections open; failed
+    # requests (connection errors, 429 and 5xx answers) are retried with exponential
+    # backoff. Many images are downloaded in parallel by max_workers threads and every
+    # downloaded image is stored in cache_dir, so it is only downloaded once.
+    # timeout is the (connect, read) timeout in seconds of every request, so that a
+    # server that stops answering raises an error (and is retried) instead of hanging.
+    def __init__(self, base_url=IDR_URL, cache_dir='idr_cache', max_workers=8,
+                 retries=5, backoff_factor=0.5, timeout=(10, 60)):
+        self.base_url = base_url.rstrip('/')
+        self.cache_dir = Path(cache_dir)
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504), allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def get_json(self, url):
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def plates(self, screen_id):
+        return self.get_json(PLATES_URL.format(base_url=self.base_url, screen_id=screen_id))['plates']
+
+    def well_grid(self, plate_id, field=0):
+        # the grid of wells with 'rowlabels', 'collabels' and 'grid' like in the blog post
+        return self.get_json(WELLS_IMAGES_URL.format(base_url=self.base_url, plate_id=plate_id, field=field))
+
+    def well_image_ids(self, plate_id, field=0):
+        # image IDs of all wells of a plate, row by row, empty wells are skipped
+        grid = self.well_grid(plate_id, field)
+        return [cell['id'] for row in grid['grid'] for cell in row if cell is not None]
+
+    def thumbnail(self, image_id):
+        return imread(self._download('thumbnail', THUMBNAIL_URL, image_id))
+
+    def image(self, image_id):
+        return imread(self._download('image', IMAGE_URL, image_id))
+
+    def thumbnails(self, image_ids):
+        return self._download_many(self.thumbnail, image_ids)
+
+    def images(self, image_ids):
+        return self._download_many(self.image, image_ids)
+
+    def _download_many(self, download, image_ids):
+        # at most max_workers downloads run at the same time, results keep the order
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(download, image_ids))
+
+    def _download(self, kind, generic_url, image_id):
+        # returns the encoded image, from the cache if it was downloaded before
+        cache_file = self.cache_dir / kind / str(image_id)
+        if cache_file.exists():
+            return cache_file.read_bytes()
+
+        response = self.session.get(generic_url.format(base_url=self.base_url, image_id=image_id),
+                                    timeout=self.timeout)
+        response.raise_for_status()
+
+        # write to a temporary file first, so an interrupted download never ends up in the
+        # cache; every call gets its own file, threads downloading the same image don't collide
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_file.parent, prefix='{}.'.format(image_id),
+                                         suffix='.part', delete=False) as temporary_file:
+            temporary_file.write(response.content)
+        os.replace(temporary_file.name, cache_file)
+        return response.content
@@ -0,0 +1,149 @@
+from functools import lru_cache
+
+import numpy as np
+from skimage import morphology
+
+
+class Backend:
+    # Everything a library like numpy/scikit-image or cupy/cucim needs to run our image
+    # processing functions: the array type it works on, its numpy-like module (xp), its
+    # scikit-image-like morphology module and how images are sent to its memory and back.
+    # Transfers between computer memory and device (e.g. GPU) memory are counted.
+    def __init__(self, name, array_type, xp, morphology, to_device, to_host):
+        self.name = name
+        self.array_type = array_type
+        self.xp = xp
+        self.morphology = morphology
+        self._to_device = to_device
+        self._to_host = to_host
+        self.transfers = {'to_device': 0, 'to_host': 0}
+        # the disk of every radius is only built once (in the backend's memory), like
+        # get_footprint in image_analysis_functions; calls on every frame reuse it
+        self.disk = lru_cache(maxsize=32)(morphology.disk) if morphology is not None else None
+
+    def owns(self, array):
+        return isinstance(array, self.array_type)
+
+    def to_device(self, array):
+        if self.owns(array):
+            return array                        # already there, nothing to transfer
+        self.transfers['to_device'] += 1
+        return self._to_device(array)
+
+    def to_host(self, array):
+        if not self.owns(array):
+            return array
+        self.transfers['to_host'] += 1
+        return self._to_host(array)
+
+    def subtract_background(self, image, radius=50, light_bg=False):
+        str_el = self.disk(radius)
+        if light_bg:
+            return self.morphology.black_tophat(image, str_el)
+        else:
+            return self.morphology.white_tophat(image, str_el)
+
+    def flood(self, image, delta):
+        new_level = delta*85
+        label_image = self.xp.where(image <= new_level, self.xp.uint8(13), self.xp.uint8(0))  # label 13 is blue in napari
+        return(label_image, new_level)
+
+
+class ClesperantoBackend(Backend):
+    # clesperanto has its own function names, so the image processing is written again.
+    # The array type is only looked up when an array is checked for the first time:
+    # pushing an array selects an OpenCL device, which shouldn't happen on import and
+    # fails on computers without one.
+    def __init__(self, cle):
+        self.cle = cle
+        super().__init__('clesperanto', None, np, None, cle.push, cle.pull)
+
+    def owns(self, array):
+        if self.array_type is None:
+            try:
+                self.array_type = type(self.cle.push(np.zeros((1, 1))))
+            except Exception:               # no OpenCL device (pyopencl raises its own errors)
+                self.array_type = ()        # then this backend owns no arrays
+        return isinstance(array, self.array_type)
+
+    def subtract_background(self, image, radius=50, light_bg=False):
+        # Not the same operation as the disk top-hat of the other backends, the results
+        # differ slightly: clesperanto's sphere is an ellipse with radius_x and radius_y,
+        # pixels outside the image are treated differently at the borders and images
+        # are processed as float32. Compare with the numpy backend before mixing them.
+        cle = self.cle
+        if light_bg:
+            closed = cle.minimum_sphere(cle.maximum_sphere(image, radius_x=radius, radius_y=radius),
+                                        radius_x=radius, radius_y=radius)
+            return cle.subtract_images(closed, image)
+        else:
+            return cle.top_hat_sphere(image, radius_x=radius, radius_y=radius)
+
+    def flood(self, image, delta):
+        new_level = delta*85
+        binary = self.cle.smaller_or_equal_constant(image, constant=new_level)
+        return(self.cle.multiply_image_and_scalar(binary, scalar=13), new_level)
+
+
+numpy_backend = Backend('numpy', np.ndarray, np, morphology, np.asarray, np.asarray)
+backends = []
+
+
+def register_backend(backend):
+    # backends registered later are asked first which arrays they own
+    backends.insert(0, backend)
+    return backend
+
+
+def get_backend(array_or_name):
+    # the backend an array belongs to, or the backend with a given name;
+    # arrays that no backend owns are processed with numpy
+    if isinstance(array_or_name, str):
+        for backend in backends + [numpy_backend]:
+            if backend.name == array_or_name:
+                return backend
+        raise ValueError('backend {} is not available'.format(array_or_name))
+
+    for backend in backends:
+        if backend.owns(array_or_name):
+            return backend
+    return numpy_backend
+
+
+def to_device(array, backend='cupy'):
+    return get_backend(backend).to_device(array)
+
+
+def to_host(array):
+    # numpy array of any array, e.g. for showing it with matplotlib or saving it
+    return np.asarray(get_backend(array).to_host(array))
+
+
+def imshow(image):
+    # replaces gpu_imshow from the blog post, works for every backend
+    from skimage.io import imshow as skimage_imshow
+    skimage_imshow(to_host(image))
+
+
+# The image processing functions run on the backend of the image they get and return an
+# image of the same backend, so chained calls keep the data on the GPU.
+def subtract_background(image, radius=50, light_bg=False):
+    return get_backend(image).subtract_background(image, radius, light_bg)
+
+
+def flood(image, delta):
+    return get_backend(image).flood(image, delta)
+
+
+try:
+    import cupy as cp
+    import cucim.skimage.morphology
+    register_backend(Backend('cupy', cp.ndarray, cp, cucim.skimage.morphology, cp.asarray, cp.asnumpy))
+except ImportError:
+    pass
+
+try:
+    import pyclesperanto_prototype as cle
+    register_backend(ClesperantoBackend(cle))
+except ImportError:
+    pass
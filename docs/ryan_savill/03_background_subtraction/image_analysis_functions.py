@@ -1,12 +1,387 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import itertools
+
+import numpy as np
+from scipy import fft
+from scipy.ndimage import correlate1d, median_filter, minimum_filter1d, maximum_filter1d
+from skimage.filters import threshold_otsu
+from skimage.morphology import white_tophat, black_tophat, disk
+
+from image_io import open_image, create_image
+
+# the imports are at the top of this file instead of inside the functions, so that
+# calling the functions many times (e.g. on every frame of a movie) doesn't pay for them
+
+
+@lru_cache(maxsize=32)
+def get_footprint(radius, ndim=2):
+    # structuring elements are cached, so they are only built once per radius. For
+    # stacks the disk gets leading axes of length 1, so every plane is filtered on
+    # its own, like in subtract_background_batch and the tiled and fast versions
+    footprint = disk(radius)
+    footprint = footprint.reshape((1,) * (ndim - 2) + footprint.shape)
+
+    # the same array is handed out every time, so make sure nobody changes it
+    footprint.setflags(write=False)
+    return footprint
+
+
 def subtract_background(image, radius=50, light_bg=False):
-    # import libraries
-    from skimage.morphology import white_tophat, black_tophat, disk 
-    
-    # generate structuring element
-    str_el = disk(radius)
+    # get the (cached) structuring element
+    str_el = get_footprint(radius, image.ndim)
      
     # use appropriate filter depending on the background colour
     if light_bg:
         return black_tophat(image, str_el)
     else:
-        return white_tophat(image, str_el)
\ No newline at end of file
+        return white_tophat(image, str_el)
+
+
+# median_and_otsutresh uses the histogram median for uint8/uint16 images if the image
+# has fewer intensity levels than this times the number of pixels in the window
+HISTOGRAM_MEDIAN_LEVELS = 2
+
+
+def median_and_otsutresh(img, mediansize=1, blackbgnd=True, out=None, packed=False):
+    # median filter followed by Otsu's threshold, as in the introduction to scikit-image.
+    # The binary result is written into out if it is given (a bool array of the image
+    # shape), with packed=True it is stored with 8 pixels per byte along the last axis
+    # (as np.packbits, out must then have the packed shape).
+    size = np.broadcast_to(mediansize, (img.ndim,))
+    levels = None
+    if img.dtype in (np.uint8, np.uint16):
+        levels = np.flatnonzero(np.bincount(img.ravel()))
+
+    if levels is not None and len(levels) < HISTOGRAM_MEDIAN_LEVELS * np.prod(size):
+        # for large windows: median and Otsu histogram in one pass over the intensities
+        below, counts = _histogram_median(img, levels, tuple(int(s) for s in size))
+        filled = np.flatnonzero(counts)
+        if len(filled) == 1:
+            # only one intensity left, nothing is above or below the threshold
+            index = filled[0]
+        else:
+            # the same histogram threshold_otsu builds for an integer image
+            first, last = levels[filled[0]], levels[filled[-1]]
+            hist = np.zeros(last - first + 1, dtype=np.int64)
+            hist[levels[filled] - first] = counts[filled]
+            tresh = threshold_otsu(hist=(hist, np.arange(first, last + 1)))
+            index = np.searchsorted(levels, tresh)
+        compare = np.greater if blackbgnd else np.less
+        binary = compare(below, index, out=None if out is None or packed else out)
+    else:
+        medianimg = median_filter(img, mediansize)
+        tresh = threshold_otsu(medianimg)
+        compare = np.greater if blackbgnd else np.less
+        binary = compare(medianimg, tresh, out=None if out is None or packed else out)
+
+    if packed:
+        if out is None:
+            return np.packbits(binary, axis=-1)
+        out[...] = np.packbits(binary, axis=-1)
+        return out
+    return binary
+
+
+def _histogram_median(img, levels, size):
+    # Median filter whose cost does not depend on the window size: for every intensity
+    # level, the number of window pixels at or below it is a box sum of a binary image,
+    # computed with cumulative sums. The median of a pixel is the first level at which
+    # more than half of its window is reached. Returns the index of the median into
+    # levels for every pixel and the histogram of the median filtered image.
+    rank = int(np.prod(size)) // 2 + 1
+    # the same borders (mode='reflect') and window positions as scipy's median_filter
+    padded = np.pad(img, [(s // 2, s - 1 - s // 2) for s in size], mode='symmetric')
+    indicator = np.empty(padded.shape, dtype=bool)
+
+    below = np.zeros(img.shape, dtype=np.uint16)
+    cumulative = np.full(len(levels), img.size, dtype=np.int64)
+    for index, level in enumerate(levels):
+        np.less_equal(padded, level, out=indicator)
+        not_reached = _window_sums(indicator, size) < rank
+        n_not_reached = np.count_nonzero(not_reached)
+        if n_not_reached == 0:
+            # every median is found, the remaining levels don't change anything
+            break
+        cumulative[index] = img.size - n_not_reached
+        below += not_reached
+    counts = np.diff(cumulative, prepend=0)
+    return below, counts
+
+
+def _window_sums(image, size):
+    # sums over a window of the given size around every pixel, for an image that is
+    # padded by the window size; running sums, so the cost is independent of size
+    sums = image
+    for axis, length in enumerate(size):
+        cumulative = np.moveaxis(np.cumsum(sums, axis=axis, dtype=np.int32), axis, 0)
+        window = cumulative[length - 1:].copy()
+        window[1:] -= cumulative[:-length]
+        sums = np.moveaxis(window, 0, axis)
+    return sums
+
+
+def subtract_background_batch(frames, radius=50, light_bg=False, out=None):
+    # subtract_background for many 2D frames (a list or a 3D array) at once: all
+    # frames share one structuring element and the results are written into one
+    # preallocated array instead of allocating a new array per frame
+    str_el = get_footprint(radius, 2)
+    tophat = black_tophat if light_bg else white_tophat
+
+    if out is None:
+        out = np.empty(_batch_shape(frames), dtype=_batch_dtype(frames))
+    for frame, frame_out in zip(frames, out):
+        tophat(frame, str_el, out=frame_out)
+    return out
+
+
+def _batch_shape(frames):
+    # shape of the stacked frames; an empty array still knows its frame shape,
+    # an empty list doesn't
+    if hasattr(frames, 'shape'):
+        return frames.shape
+    if len(frames) == 0:
+        raise ValueError('frames is empty, pass an array of shape (0, rows, columns) instead')
+    return (len(frames),) + frames[0].shape
+
+
+def _batch_dtype(frames):
+    return frames.dtype if hasattr(frames, 'dtype') else frames[0].dtype
+
+
+# above this sigma a Gaussian blur is faster in Fourier space than as a separable
+# convolution, whose cost grows with the kernel size
+FFT_SIGMA = 5
+
+
+@lru_cache(maxsize=32)
+def get_gaussian_kernel(sigma, dtype=np.float32, truncate=4.0):
+    # 1D Gaussian kernel, cut off at truncate * sigma like scipy's gaussian_filter
+    radius = int(truncate * sigma + 0.5)
+    x = np.arange(-radius, radius + 1)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    kernel = (kernel / kernel.sum()).astype(dtype)
+    kernel.setflags(write=False)
+    return kernel
+
+
+# every transfer function is as large as an image, so only the two of one
+# subtract_background_dog call (small and missing large blur) are kept
+@lru_cache(maxsize=2)
+def get_fourier_gaussian(shape, sigma, dtype=np.float32):
+    # the Gaussian in Fourier space for an image of the given shape (last axis halved,
+    # as returned by rfftn), built from one 1D Gaussian per axis
+    transfer = np.ones((1,) * len(shape), dtype=dtype)
+    for axis, size in enumerate(shape):
+        if axis == len(shape) - 1:
+            frequencies = fft.rfftfreq(size)
+        else:
+            frequencies = fft.fftfreq(size)
+        factor = np.exp(-2 * (np.pi * sigma * frequencies) ** 2).astype(dtype)
+        transfer = transfer * factor.reshape((-1,) + (1,) * (len(shape) - 1 - axis))
+    transfer.setflags(write=False)
+    return transfer
+
+
+def subtract_background_dog(image, low_sigma=1, high_sigma=100, light_bg=False,
+                            dtype=np.float32, method='auto', out=None):
+    # Difference of Gaussians: the image blurred with low_sigma minus the image
+    # blurred with high_sigma, over all axes of the image (unlike subtract_background,
+    # a 3D stack is filtered in 3D). Unlike skimage's difference_of_gaussians the
+    # intensities are not rescaled to 0..1.
+    #
+    # The large blur is computed from the small one, blurring it by the missing
+    # sqrt(high_sigma**2 - low_sigma**2). Small sigmas are filtered with a separable
+    # kernel, large ones with an FFT (method='auto'), or force 'separable' or 'fft'.
+    # dtype=np.float32 needs half the memory of float64.
+    if out is None:
+        out = np.empty(image.shape, dtype=dtype)
+    work = np.empty(image.shape, dtype=out.dtype)
+    return _difference_of_gaussians(image, low_sigma, high_sigma, light_bg, method, out, work)
+
+
+def subtract_background_dog_batch(frames, low_sigma=1, high_sigma=100, light_bg=False,
+                                  dtype=np.float32, method='auto', out=None):
+    # subtract_background_dog for many 2D frames (a list or a 3D array): the kernels
+    # are only built once and all frames reuse the same working buffer
+    shape = _batch_shape(frames) if out is None else out.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype)
+    work = np.empty(shape[1:], dtype=out.dtype)
+    for frame, frame_out in zip(frames, out):
+        _difference_of_gaussians(frame, low_sigma, high_sigma, light_bg, method, frame_out, work)
+    return out
+
+
+def _difference_of_gaussians(image, low_sigma, high_sigma, light_bg, method, out, work):
+    # the small blur goes to work, the large blur (computed from the small one) to out
+    if high_sigma <= low_sigma:
+        raise ValueError('high_sigma ({}) must be larger than low_sigma ({})'.format(
+            high_sigma, low_sigma))
+    _gaussian(image, low_sigma, method, work)
+    _gaussian(work, np.sqrt(high_sigma ** 2 - low_sigma ** 2), method, out)
+
+    if light_bg:
+        np.subtract(out, work, out=out)
+    else:
+        np.subtract(work, out, out=out)
+    return out
+
+
+def _gaussian(image, sigma, method, out):
+    # Gaussian blur of image into out, with the same 'nearest' borders in both methods
+    if method == 'auto':
+        method = 'fft' if sigma > FFT_SIGMA else 'separable'
+
+    if method == 'separable':
+        kernel = get_gaussian_kernel(sigma, out.dtype.type)
+        source = image
+        for axis in range(image.ndim):
+            # after the first axis the filter runs in place, like scipy's gaussian_filter
+            correlate1d(source, kernel, axis=axis, output=out, mode='nearest')
+            source = out
+    elif method == 'fft':
+        pad = len(get_gaussian_kernel(sigma)) // 2
+        padded = np.pad(image.astype(out.dtype, copy=False), pad, mode='edge')
+        spectrum = fft.rfftn(padded, workers=-1)
+        spectrum *= get_fourier_gaussian(padded.shape, sigma, out.dtype.type)
+        blurred = fft.irfftn(spectrum, padded.shape, workers=-1)
+        out[...] = blurred[tuple(slice(pad, pad + n) for n in image.shape)]  # also for pad == 0
+    else:
+        raise ValueError('unknown method: {}'.format(method))
+    return out
+
+
+def fast_subtract_background(image, radius=50, light_bg=False):
+    # same as subtract_background, but the disk is approximated by an octagon
+    # built from four line segments (horizontal, vertical and both diagonals).
+    # Every line is filtered with a running minimum/maximum whose cost does not
+    # depend on the line length, so large radii are as fast as small ones.
+    # The filter works on the last two axes, a stack is processed plane by plane.
+
+    # half lengths of the axis-aligned and diagonal lines of a regular octagon
+    # inscribed in the disk: its corners lie at distance radius from the center
+    # (half_axis + 2 * half_diag along the axes, (half_axis + half_diag) * sqrt(2)
+    # along the diagonals)
+    half_axis = int(round(radius * (np.sqrt(2) - 1)))
+    half_diag = int(round(radius * (1 - 1 / np.sqrt(2))))
+
+    # pad once so that pixels at the border see mirrored neighbours; np.pad's
+    # 'symmetric' repeats the edge pixel like ndimage's 'reflect' that skimage uses.
+    # The octagon is mirror symmetric, so the eroded (dilated) padding is the mirror
+    # of the eroded image, as if the second filter mirrored its input like skimage:
+    # that needs a padding of two octagon radii.
+    pad = 2 * (half_axis + 2 * half_diag)
+    pad_width = [(0, 0)] * (image.ndim - 2) + [(pad, pad)] * 2
+    padded = np.pad(image, pad_width, mode='symmetric')
+
+    # a closing (dilation, then erosion) highlights dark spots on a light background,
+    # an opening (erosion, then dilation) highlights light spots on a dark background
+    if light_bg:
+        background = _octagon_filter(padded, half_axis, half_diag, 'max')
+        background = _octagon_filter(background, half_axis, half_diag, 'min')
+        result = background - padded
+    else:
+        background = _octagon_filter(padded, half_axis, half_diag, 'min')
+        background = _octagon_filter(background, half_axis, half_diag, 'max')
+        result = padded - background
+
+    return result[..., pad:-pad, pad:-pad] if pad else result
+
+
+def _octagon_filter(image, half_axis, half_diag, operation):
+    # erosion ('min') or dilation ('max') with an octagon, done as a sequence of lines
+    filter1d = minimum_filter1d if operation == 'min' else maximum_filter1d
+    result = image
+    if half_axis > 0:
+        # minimum_filter1d/maximum_filter1d are running filters, independent of the size
+        result = filter1d(result, 2 * half_axis + 1, axis=-1, mode='nearest')
+        result = filter1d(result, 2 * half_axis + 1, axis=-2, mode='nearest')
+    if half_diag > 0:
+        for flip in (False, True):
+            result = _diagonal_filter(result, 2 * half_diag + 1, filter1d, operation, flip)
+    return result
+
+
+def _diagonal_filter(image, size, filter1d, operation, flip):
+    # shear the image so that a diagonal becomes a column, filter along the
+    # columns and shear back; the added corners are filled with a value that
+    # never wins the minimum/maximum
+    if np.issubdtype(image.dtype, np.integer):
+        info = np.iinfo(image.dtype)
+    else:
+        info = np.finfo(image.dtype)
+    fill = info.max if operation == 'min' else info.min
+
+    rows, cols = image.shape[-2:]
+    row_index = np.arange(rows)[:, None]
+    col_index = np.arange(cols)[None, :] + (rows - 1 - row_index if flip else row_index)
+
+    sheared = np.full(image.shape[:-1] + (cols + rows - 1,), fill, dtype=image.dtype)
+    sheared[..., row_index, col_index] = image
+    sheared = filter1d(sheared, size, axis=-2, mode='constant', cval=fill)
+    return sheared[..., row_index, col_index]
+
+
+def tiled_subtract_background(image, radius=50, light_bg=False, output=None,
+                              tile_size=1024, n_workers=None, method=subtract_background):
+    # subtract_background for images that are too large for memory: every plane
+    # is split into tiles that are processed in a thread pool. Only the tiles that
+    # are currently processed are loaded, so memory depends on tile_size instead
+    # of the size of the stack.
+    #
+    # image can be a numpy array, a numpy/tifffile memmap, a zarr array or the
+    # path to a .tif/.npy file or a zarr store. output can be an array of the same
+    # shape (e.g. a zarr array with chunks of one plane whose height and width
+    # divide tile_size, so that no two tiles share a chunk),
+    # the path of a .tif or .npy file that will be created, or None for an
+    # in-memory result. method is the function that is applied to every tile,
+    # e.g. fast_subtract_background.
+    image = open_image(image)
+    output = create_image(output, image.shape, image.dtype)
+    _check_chunks(output, tile_size)
+
+    # erosion and dilation both look radius pixels far, so a halo of twice the
+    # radius (plus one for the rounding of the octagon) makes every tile identical
+    # to the corresponding part of the whole image
+    halo = 2 * (radius + 1)
+    rows, cols = image.shape[-2:]
+    planes = list(itertools.product(*[range(n) for n in image.shape[:-2]]))
+    tiles = [(plane, row, col)
+             for plane in planes
+             for row in range(0, rows, tile_size)
+             for col in range(0, cols, tile_size)]
+
+    def process_tile(tile):
+        plane, row, col = tile
+        top, left = max(row - halo, 0), max(col - halo, 0)
+        bottom = min(row + tile_size + halo, rows)
+        right = min(col + tile_size + halo, cols)
+
+        data = np.asarray(image[plane + (slice(top, bottom), slice(left, right))])
+        result = method(data, radius, light_bg)
+
+        inner = (slice(row - top, row - top + min(tile_size, rows - row)),
+                 slice(col - left, col - left + min(tile_size, cols - col)))
+        output[plane + (slice(row, row + tile_size), slice(col, col + tile_size))] = result[inner]
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        # consuming the results re-raises exceptions from the workers
+        for _ in pool.map(process_tile, tiles):
+            pass
+
+    if hasattr(output, 'flush'):
+        output.flush()
+    return output
+
+
+def _check_chunks(output, tile_size):
+    # chunked outputs (zarr) are written chunk by chunk: two threads writing tiles
+    # that share a chunk would overwrite each other's pixels
+    chunks = getattr(output, 'chunks', None)
+    if chunks is None:
+        return
+    if any(size != 1 for size in chunks[:-2]) or tile_size % chunks[-2] or tile_size % chunks[-1]:
+        raise ValueError('tile_size {} does not fit the chunks {} of the output, tiles would '
+                         'share chunks; use chunks of one plane that divide tile_size'.format(
+                             tile_size, chunks))
@@ -0,0 +1,168 @@
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from pathlib import Path
+import threading
+
+import numpy as np
+
+# Open large images without reading them into memory: uncompressed TIFFs and .npy
+# files are memory mapped, zarr and OME-Zarr stores are opened as chunked arrays.
+# The returned arrays only read the pixels that are sliced, so they can be handed to
+# napari (viewer.add_image) or to the functions in image_analysis_functions.py
+# plane by plane or tile by tile.
+#
+#   stack = open_image('big_stack.tif')
+#   for plane in PrefetchedArray(stack):
+#       result = subtract_background(plane, 15)
+#
+# tifffile and zarr are only needed for the respective file types and are imported
+# when such a file is opened.
+
+TIFF_SUFFIXES = ('.tif', '.tiff')
+
+
+def open_image(source, level=0):
+    # open a path as a lazy array; arrays (numpy, zarr, memmaps, ...) are returned
+    # as they are. For OME-Zarr, level selects the resolution (0 is full resolution).
+    if not isinstance(source, (str, Path)):
+        return source
+    name = str(source).rstrip('/')
+
+    if name.endswith(TIFF_SUFFIXES):
+        import tifffile
+        try:
+            return tifffile.memmap(name, mode='r')
+        except ValueError:
+            # compressed or tiled TIFFs can't be memory mapped, read them chunk by
+            # chunk through tifffile's zarr interface instead
+            import zarr
+            return zarr.open(tifffile.imread(name, aszarr=True), mode='r')
+    if name.endswith('.npy'):
+        return np.load(name, mmap_mode='r')
+    if name.endswith('.zarr') or Path(name).is_dir():
+        return open_multiscale(name)[level]
+
+    # formats like png or jpg are compressed as a whole and have to be read completely
+    from skimage.io import imread
+    return imread(name)
+
+
+def open_multiscale(source):
+    # all resolution levels of an OME-Zarr image, full resolution first. The list can
+    # be passed to napari with viewer.add_image(levels, multiscale=True), or to
+    # PyramidPreview. A plain zarr array is returned as a single level.
+    import zarr
+    store = zarr.open(str(source), mode='r')
+    if hasattr(store, 'shape'):
+        return [store]
+
+    # OME-Zarr 0.4 keeps the metadata at the top level, 0.5 under 'ome'
+    attributes = store.attrs.asdict() if hasattr(store.attrs, 'asdict') else dict(store.attrs)
+    multiscales = attributes.get('ome', attributes).get('multiscales')
+    if not multiscales:
+        raise ValueError('{} is a zarr group, but not an OME-Zarr image'.format(source))
+    return [store[dataset['path']] for dataset in multiscales[0]['datasets']]
+
+
+def create_image(output, shape, dtype):
+    # create an array that results can be written to piece by piece: None gives an
+    # array in memory, a path ending with .tif/.tiff a memory mapped TIFF, any other
+    # path a memory mapped .npy file. Existing arrays are checked and returned.
+    if output is None:
+        return np.empty(shape, dtype=dtype)
+    if not isinstance(output, (str, Path)):
+        if output.shape != tuple(shape):
+            raise ValueError('output has shape {}, expected {}'.format(output.shape, shape))
+        return output
+    if str(output).endswith(TIFF_SUFFIXES):
+        import tifffile
+        return tifffile.memmap(str(output), shape=shape, dtype=dtype)
+    return np.lib.format.open_memmap(str(output), mode='w+', shape=shape, dtype=dtype)
+
+
+class PrefetchedArray:
+    # Wraps a lazy array and reads the planes following the one that is accessed in
+    # a thread pool, so that the next plane is (mostly) in memory by the time it is
+    # needed. This helps when planes are accessed in order, e.g. when scrolling
+    # through a stack in napari or when processing it plane by plane, and the
+    # reads are slow (compressed chunks, network drives).
+    #
+    # Indexing works like for the wrapped array; only indices that start with a
+    # single plane number (stack[5], stack[5, 100:200]) use the prefetched planes.
+
+    def __init__(self, image, n_ahead=4, n_workers=4):
+        self.image = open_image(image)
+        self.n_ahead = n_ahead
+        self._pool = ThreadPoolExecutor(max_workers=n_workers)
+        # plane number -> future with the plane as numpy array, used by several
+        # threads (e.g. napari's slicing thread and a processing loop)
+        self._planes = {}
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        return self.image.shape
+
+    @property
+    def dtype(self):
+        return self.image.dtype
+
+    @property
+    def ndim(self):
+        return len(self.image.shape)
+
+    def __len__(self):
+        return self.image.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        if not key or not isinstance(key[0], (int, np.integer)):
+            return np.asarray(self.image[key])
+
+        index = int(key[0])
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('index {} is out of bounds for axis 0 with size {}'.format(
+                key[0], len(self)))
+        plane = self.get_plane(index)
+        return plane[key[1:]] if len(key) > 1 else plane
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.get_plane(index)
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.image[...], dtype=dtype)
+
+    def get_plane(self, index):
+        # the plane at index, plus read requests for the n_ahead following planes;
+        # planes that are not close to index anymore are dropped
+        wanted = range(index, min(index + self.n_ahead + 1, len(self)))
+        with self._lock:
+            for number in wanted:
+                if number not in self._planes:
+                    self._planes[number] = self._pool.submit(self._read_plane, number)
+            for number in list(self._planes):
+                if number not in wanted:
+                    self._planes.pop(number).cancel()
+            future = self._planes[index]
+        try:
+            return future.result()
+        except CancelledError:
+            # dropped by another thread that reads a different part of the stack
+            return self._read_plane(index)
+
+    def _read_plane(self, index):
+        return np.asarray(self.image[index])
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            self._planes.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,185 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import os
+from pathlib import Path
+
+import numpy as np
+from skimage import measure
+
+from image_analysis_functions import subtract_background, median_and_otsutresh
+from image_io import open_image
+
+# The segmentation from the introduction to scikit-image as a chain of steps,
+#
+#   labels = measure.label(median_and_otsutresh(subtract_background(image, 15), 1))
+#
+# that is only computed when a result is requested. Every intermediate result is
+# stored in cache_dir under a key made from the hash of the input image and the
+# parameters of all steps up to it. Changing the parameters of a later step (e.g. the
+# median size) therefore reuses the cached background subtraction, and running the
+# pipeline again on the same files only loads the labels.
+#
+#   pipeline = segmentation_pipeline(radius=15, cache_dir='cache')
+#   labels = pipeline.run('image.tif')
+#   pipeline.update('median_and_otsutresh', mediansize=3)
+#   all_labels = pipeline.run_batch(files, n_workers=8)
+
+
+class Step:
+    # one step of a pipeline: function(previous result, **params)
+    #
+    # The cache key contains the bytecode and constants of the function, so editing
+    # it invalidates its cached results. Changes the key can't see (in functions it
+    # calls, or in functions without python bytecode like numpy's) need a new version.
+    def __init__(self, name, function, version=None, **params):
+        self.name = name
+        self.function = function
+        self.version = version
+        self.params = params
+
+    def key(self, previous_key):
+        # the parameters are sorted, so the order they were given in doesn't matter
+        code = getattr(self.function, '__code__', None)
+        description = '{}|{}.{}|{}|{}|{}'.format(
+            previous_key, self.function.__module__, self.function.__qualname__,
+            '' if code is None else _code_fingerprint(code), self.version,
+            sorted(self.params.items()))
+        return hashlib.sha1(description.encode()).hexdigest()
+
+
+def _code_fingerprint(code):
+    # bytecode and constants of a code object and of the functions defined in it,
+    # without memory addresses, so that it is the same in every worker process
+    parts = [code.co_code.hex()]
+    for constant in code.co_consts:
+        if hasattr(constant, 'co_code'):
+            parts.append(_code_fingerprint(constant))
+        elif isinstance(constant, frozenset):
+            parts.append(repr(sorted(map(repr, constant))))
+        else:
+            parts.append(repr(constant))
+    return '|'.join(parts)
+
+
+class Pipeline:
+    def __init__(self, steps, cache_dir=None):
+        self.steps = list(steps)
+        self.cache_dir = None if cache_dir is None else Path(cache_dir)
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def update(self, name, **params):
+        # change parameters of a step; cached results of the steps before it stay valid
+        for step in self.steps:
+            if step.name == name:
+                step.params.update(params)
+                return self
+        raise KeyError('no step named {}'.format(name))
+
+    def run(self, source, until=None):
+        # the result of the step called until (default: the last step) for an image
+        # or the path of an image. Starting from the end, the first step that is
+        # cached is loaded and only the steps after it are computed.
+        steps = self._steps(until)
+        keys = self._keys(source, steps)
+
+        start, result = 0, None
+        for index in reversed(range(len(steps))):
+            result = self._load(steps[index], keys[index])
+            if result is not None:
+                start = index + 1
+                break
+        if start == 0:
+            result = np.asarray(open_image(source))
+
+        for step, key in zip(steps[start:], keys[start:]):
+            result = step.function(result, **step.params)
+            self._store(step, key, result)
+        return result
+
+    def run_batch(self, sources, n_workers=None, until=None):
+        # run many images in parallel processes. With a cache the workers only
+        # return the path of the result, which is then memory mapped, instead of
+        # sending the whole array back to this process.
+        sources = list(sources)
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(self._run_for_batch, sources, [until] * len(sources)))
+        return [np.load(result, mmap_mode='r') if isinstance(result, Path) else result
+                for result in results]
+
+    def _run_for_batch(self, source, until):
+        if self.cache_dir is None:
+            return self.run(source, until)
+        steps = self._steps(until)
+        path = self._cache_path(steps[-1], self._keys(source, steps)[-1])
+        if not path.exists():
+            self.run(source, until)
+        return path
+
+    def _steps(self, until):
+        if until is None:
+            return self.steps
+        names = [step.name for step in self.steps]
+        return self.steps[:names.index(until) + 1]
+
+    def _keys(self, source, steps):
+        # the key of every step depends on the input and on all steps before it
+        keys = []
+        key = input_hash(source)
+        for step in steps:
+            key = step.key(key)
+            keys.append(key)
+        return keys
+
+    def _cache_path(self, step, key):
+        return self.cache_dir / '{}-{}.npy'.format(step.name, key)
+
+    def _load(self, step, key):
+        if self.cache_dir is None:
+            return None
+        path = self._cache_path(step, key)
+        if not path.exists():
+            return None
+        return np.load(path)
+
+    def _store(self, step, key, result):
+        if self.cache_dir is None:
+            return
+        # write to a temporary file first, so that other processes never load a
+        # half written result
+        path = self._cache_path(step, key)
+        temporary = path.with_name('{}.{}.tmp.npy'.format(path.stem, os.getpid()))
+        np.save(temporary, result)
+        os.replace(temporary, path)
+
+
+def input_hash(source, block_size=2**20):
+    # hash of the content of a file (read in blocks), of all files in a directory
+    # (e.g. a zarr store) or of an array
+    digest = hashlib.sha1()
+    if isinstance(source, (str, Path)):
+        source = Path(source)
+        files = sorted(source.rglob('*')) if source.is_dir() else [source]
+        for path in files:
+            if path.is_dir():
+                continue
+            digest.update(str(path.relative_to(source)).encode() if path != source else b'')
+            with open(path, 'rb') as file:
+                for block in iter(lambda: file.read(block_size), b''):
+                    digest.update(block)
+    else:
+        array = np.ascontiguousarray(source)
+        digest.update('{}{}'.format(array.shape, array.dtype).encode())
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def segmentation_pipeline(radius=15, light_bg=False, mediansize=1, blackbgnd=True,
+                          cache_dir=None):
+    # the segmentation of the introduction to scikit-image
+    return Pipeline([
+        Step('subtract_background', subtract_background, radius=radius, light_bg=light_bg),
+        Step('median_and_otsutresh', median_and_otsutresh, mediansize=mediansize,
+             blackbgnd=blackbgnd),
+        Step('label', measure.label),
+    ], cache_dir=cache_dir)
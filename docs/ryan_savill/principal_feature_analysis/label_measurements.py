@@ -0,0 +1,176 @@
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+
+import numpy as np
+
+# Per-object features of a label image (e.g. from measure.label) for all labels at
+# once. Instead of building a python object per label like regionprops, every feature
+# is a reduction over the pixels grouped by label (np.bincount, np.minimum.at, ...),
+# so the cost hardly depends on the number of objects. The image is split into slabs
+# along the first axis that are measured in a thread pool; their partial sums, minima
+# and maxima are merged afterwards.
+#
+#   table = measure_labels(labels, intensity_image)
+#   pfa = PFA().fit(table)
+#   selected = [table.columns[i] for i in pfa.indices_]
+
+
+class MeasurementTable:
+    # Columnar table with one row per label. All columns are stored in one float64
+    # array in Fortran order, so that every column is contiguous and the table can be
+    # passed to PFA (or anything else that calls np.asarray on it) without a copy.
+    def __init__(self, labels, columns, data):
+        self.labels = labels
+        self.columns = list(columns)
+        self.data = data
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        # np.asarray(table) returns the data itself, np.array(table) a copy
+        if dtype is None or np.dtype(dtype) == self.data.dtype:
+            return self.data.copy(order='K') if copy else self.data
+        if copy is False:
+            raise ValueError('the table can only be converted to {} with a copy'.format(np.dtype(dtype)))
+        return self.data.astype(dtype)
+
+    def __getitem__(self, key):
+        # a column by name, or numpy indexing of the underlying array
+        if isinstance(key, str):
+            return self.data[:, self.columns.index(key)]
+        return self.data[key]
+
+    def keys(self):
+        return list(self.columns)
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame(self.data, index=pd.Index(self.labels, name='label'),
+                            columns=self.columns, copy=False)
+
+
+def measure_labels(label_image, intensity_image=None, tile_voxels=2**22, n_workers=None):
+    # area, bounding box, centroid, second moments (covariance of the pixel
+    # coordinates) and axis lengths of every label, plus the mean, standard deviation,
+    # minimum, maximum and weighted centroid of the intensity if an intensity image is
+    # given. Column names follow skimage's regionprops_table ('centroid-0', 'bbox-2', ...).
+    # tile_voxels: about how many pixels every slab has; a slab is at least one plane.
+    label_image = np.asarray(label_image)
+    if intensity_image is not None and intensity_image.shape != label_image.shape:
+        raise ValueError('intensity image has shape {}, labels have shape {}'.format(
+            intensity_image.shape, label_image.shape))
+    ndim = label_image.ndim
+    n_labels = int(label_image.max()) + 1
+
+    tile_size = max(1, tile_voxels // int(np.prod(label_image.shape[1:])))  # planes per slab
+    starts = range(0, label_image.shape[0], tile_size)
+    totals = None
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        for partial in pool.map(
+                lambda start: _measure_tile(label_image, intensity_image, start, tile_size, n_labels),
+                starts):
+            totals = partial if totals is None else _merge(totals, partial)
+
+    # only labels that occur in the image get a row, like in regionprops
+    present = np.flatnonzero(totals['area'])
+    present = present[present > 0]
+    area = totals['area'][present]
+
+    columns = {'area': area}
+    for axis in range(ndim):
+        columns['bbox-{}'.format(axis)] = totals['min'][axis][present]
+    for axis in range(ndim):
+        columns['bbox-{}'.format(ndim + axis)] = totals['max'][axis][present] + 1
+
+    centroid = [totals['sum'][axis][present] / area for axis in range(ndim)]
+    for axis in range(ndim):
+        columns['centroid-{}'.format(axis)] = centroid[axis]
+
+    covariance = np.empty((len(present), ndim, ndim))
+    for i, j in itertools.combinations_with_replacement(range(ndim), 2):
+        value = totals['products'][i, j][present] / area - centroid[i] * centroid[j]
+        covariance[:, i, j] = covariance[:, j, i] = value
+        columns['second_moment-{}-{}'.format(i, j)] = value
+    # the axis lengths of the ellipse (ellipsoid) with the same second moments, like
+    # regionprops: 4 * sqrt(eigenvalue) in 2D, sqrt(20 * eigenvalue) in 3D (skimage's
+    # sqrt(10 * (ev_i + ev_j - ev_k)) of the inertia tensor); other dimensions have none
+    factor = {2: 16, 3: 20}.get(ndim)
+    if factor is not None:
+        eigenvalues = np.clip(np.linalg.eigvalsh(covariance), 0, None)
+        columns['axis_major_length'] = np.sqrt(factor * eigenvalues[:, -1])
+        columns['axis_minor_length'] = np.sqrt(factor * eigenvalues[:, 0])
+
+    if intensity_image is not None:
+        intensity_sum = totals['intensity'][present]
+        mean = intensity_sum / area
+        columns['intensity_mean'] = mean
+        columns['intensity_std'] = np.sqrt(np.clip(
+            totals['intensity_squared'][present] / area - mean ** 2, 0, None))
+        columns['intensity_min'] = totals['intensity_min'][present]
+        columns['intensity_max'] = totals['intensity_max'][present]
+        for axis in range(ndim):
+            with np.errstate(invalid='ignore', divide='ignore'):
+                columns['weighted_centroid-{}'.format(axis)] = (
+                    totals['weighted_sum'][axis][present] / intensity_sum)
+
+    data = np.empty((len(present), len(columns)), order='F')
+    for index, values in enumerate(columns.values()):
+        data[:, index] = values
+    return MeasurementTable(present, columns, data)
+
+
+def _measure_tile(label_image, intensity_image, start, tile_size, n_labels):
+    # sums, minima and maxima per label for the slab starting at row start; only the
+    # labelled pixels are visited
+    tile = label_image[start:start + tile_size]
+    flat = np.flatnonzero(tile)
+    labels = tile.ravel()[flat]
+    # as float64, np.minimum.at and np.maximum.at are much slower when they have to cast
+    coordinates = [c.astype(np.float64) for c in np.unravel_index(flat, tile.shape)]
+    coordinates[0] += start
+    ndim = len(coordinates)
+
+    def bincount(weights):
+        return np.bincount(labels, weights=weights, minlength=n_labels)
+
+    def reduce_at(ufunc, values, fill):
+        result = np.full(n_labels, fill, dtype=np.float64)
+        ufunc.at(result, labels, values)
+        return result
+
+    partial = {
+        'area': np.bincount(labels, minlength=n_labels),
+        'sum': np.array([bincount(c) for c in coordinates]),
+        'min': np.array([reduce_at(np.minimum, c, np.inf) for c in coordinates]),
+        'max': np.array([reduce_at(np.maximum, c, -np.inf) for c in coordinates]),
+        'products': np.zeros((ndim, ndim, n_labels)),
+    }
+    for i, j in itertools.combinations_with_replacement(range(ndim), 2):
+        partial['products'][i, j] = bincount(coordinates[i] * coordinates[j])
+
+    if intensity_image is not None:
+        intensity = np.asarray(intensity_image[start:start + tile_size]).ravel()[flat]
+        intensity = intensity.astype(np.float64)
+        partial['intensity'] = bincount(intensity)
+        partial['intensity_squared'] = bincount(intensity ** 2)
+        partial['intensity_min'] = reduce_at(np.minimum, intensity, np.inf)
+        partial['intensity_max'] = reduce_at(np.maximum, intensity, -np.inf)
+        partial['weighted_sum'] = np.array([bincount(c * intensity) for c in coordinates])
+    return partial
+
+
+def _merge(totals, partial):
+    # add the results of a slab: minima of minima, maxima of maxima, sums of the rest
+    for key, values in partial.items():
+        if key.endswith('min'):
+            np.minimum(totals[key], values, out=totals[key])
+        elif key.endswith('max'):
+            np.maximum(totals[key], values, out=totals[key])
+        else:
+            totals[key] += values
+    return totals
@@ -0,0 +1,167 @@
+from pathlib import Path
+
+import numpy as np
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.preprocessing import StandardScaler
+
+
+class PFA(object):
+    # Principal feature analysis as described in the blog post, written with numpy
+    # operations instead of python loops so that it also works for large tables.
+    #
+    # svd_solver is handed to scikit-learn's PCA ('auto', 'full', 'covariance_eigh',
+    # 'randomized', ...); 'randomized' only computes q components, so it needs q.
+    # 'incremental' uses IncrementalPCA, which processes the table in batches of
+    # batch_size objects. With minibatch_kmeans=True the features are clustered with
+    # MiniBatchKMeans, which helps when there are thousands of features.
+    #
+    # Tables that don't fit into memory can be passed in chunks with partial_fit (or
+    # fit_chunks); only the mean and the covariance of the features are kept, so memory
+    # depends on the number of features and not on the number of objects.
+    def __init__(self, diff_n_features=2, q=None, explained_var=0.95, svd_solver='auto',
+                 minibatch_kmeans=False, batch_size=None, random_state=None):
+        self.q = q
+        self.diff_n_features = diff_n_features
+        self.explained_var = explained_var
+        self.svd_solver = svd_solver
+        self.minibatch_kmeans = minibatch_kmeans
+        self.batch_size = batch_size
+        self.random_state = random_state
+
+    def fit(self, X):
+        # tables with named columns (a pandas DataFrame or a MeasurementTable from
+        # label_measurements.py) keep their feature names
+        if hasattr(X, 'columns'):
+            self.feature_names_ = list(X.columns)
+        elif hasattr(self, 'feature_names_'):
+            del self.feature_names_             # from an earlier fit
+        sc = StandardScaler()
+        X = sc.fit_transform(X)
+
+        pca = self._pca().fit(X)
+        self.components_ = pca.components_
+        self.explained_variance_ratio_ = pca.explained_variance_ratio_
+        self._select_features()
+        self.features_ = X[:, self.indices_]
+        return self
+
+    def partial_fit(self, X):
+        # update the running mean and co-moment matrix with one chunk of objects; the
+        # chunks are merged with the pairwise update of Chan et al., which stays accurate
+        # for many chunks
+        X = np.asarray(X, dtype=np.float64)
+        n_chunk = X.shape[0]
+        mean_chunk = X.mean(axis=0)
+        centered = X - mean_chunk
+        comoment_chunk = centered.T @ centered
+
+        if getattr(self, 'n_samples_seen_', 0) == 0:
+            self.n_samples_seen_ = n_chunk
+            self.mean_ = mean_chunk
+            self._comoment = comoment_chunk
+            return self
+
+        n_total = self.n_samples_seen_ + n_chunk
+        delta = mean_chunk - self.mean_
+        self._comoment += comoment_chunk + np.outer(delta, delta) * self.n_samples_seen_ * n_chunk / n_total
+        self.mean_ = self.mean_ + delta * n_chunk / n_total
+        self.n_samples_seen_ = n_total
+        return self
+
+    def fit_chunks(self, chunks):
+        # one pass over an iterable of chunks, e.g. read_chunks('measurements.csv')
+        self.n_samples_seen_ = 0
+        if hasattr(self, 'feature_names_'):
+            del self.feature_names_             # from an earlier fit
+        for chunk in chunks:
+            if hasattr(chunk, 'columns') and not hasattr(self, 'feature_names_'):
+                self.feature_names_ = list(chunk.columns)
+            self.partial_fit(chunk)
+        return self.fit_from_statistics()
+
+    def fit_from_statistics(self):
+        # PCA of standardized data is the eigendecomposition of the correlation matrix,
+        # which we get from the accumulated covariance
+        covariance = self._comoment / (self.n_samples_seen_ - 1)
+        std = np.sqrt(np.diag(covariance))
+        std[std == 0] = 1                       # constant features, like StandardScaler does
+        correlation = covariance / np.outer(std, std)
+
+        eigenvalues, eigenvectors = np.linalg.eigh(correlation)
+        order = np.argsort(eigenvalues)[::-1]   # largest first, like PCA
+        eigenvalues = np.clip(eigenvalues[order], 0, None)
+        self.components_ = eigenvectors[:, order].T
+        self.explained_variance_ratio_ = eigenvalues / eigenvalues.sum()
+        self._select_features()
+        return self
+
+    def fit_transform(self, X):
+        return self.fit(X).features_
+
+    def transform(self, X):
+        return X[:, self.indices_]
+
+    def _pca(self):
+        if self.svd_solver == 'incremental':
+            return IncrementalPCA(batch_size=self.batch_size)
+        if self.svd_solver == 'randomized':
+            # the randomized solver is only faster when it computes a few components
+            if not self.q:
+                raise ValueError("svd_solver='randomized' needs q, the number of components")
+            return PCA(n_components=self.q, svd_solver='randomized', random_state=self.random_state)
+        return PCA(svd_solver=self.svd_solver, random_state=self.random_state)
+
+    def _select_features(self):
+        # the number of eigenvectors that explain explained_var of the variance
+        q = self.q
+        if not q:
+            cumulative_expl_var = np.cumsum(self.explained_variance_ratio_)
+            q = max(int(np.searchsorted(cumulative_expl_var, self.explained_var)), 1)
+
+        A_q = self.components_.T[:, :q]
+        n_features = A_q.shape[0]
+
+        clusternumber = min([q + self.diff_n_features, n_features])
+
+        if self.minibatch_kmeans:
+            kmeans = MiniBatchKMeans(n_clusters=clusternumber, random_state=self.random_state)
+        else:
+            kmeans = KMeans(n_clusters=clusternumber, random_state=self.random_state)
+        kmeans.fit(A_q)
+
+        self.indices_ = closest_to_centers(A_q, kmeans.labels_, kmeans.cluster_centers_).tolist()
+
+
+def closest_to_centers(points, clusters, cluster_centers):
+    # index of the point closest to its cluster center for every cluster, all at once:
+    # sort the points by cluster and then by distance and keep the first of each cluster
+    dists = np.linalg.norm(points - cluster_centers[clusters], axis=1)
+    order = np.lexsort((dists, clusters))
+    sorted_clusters = clusters[order]
+    first_of_cluster = np.r_[True, sorted_clusters[1:] != sorted_clusters[:-1]]
+    closest = order[first_of_cluster]
+
+    # list the clusters in the order in which their first point appears, like the
+    # dictionary in the original implementation did
+    _, first_seen = np.unique(clusters, return_index=True)
+    return closest[np.argsort(first_seen)]
+
+
+def read_chunks(source, chunksize=100000, columns=None):
+    # yields a measurement table in chunks of chunksize rows: CSV and Parquet files are
+    # read piece by piece, .npy files are memory mapped, arrays are sliced
+    if not isinstance(source, (str, Path)):
+        for start in range(0, len(source), chunksize):
+            yield source[start:start + chunksize]
+    elif str(source).endswith('.csv'):
+        import pandas as pd
+        yield from pd.read_csv(source, chunksize=chunksize, usecols=columns)
+    elif str(source).endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    elif str(source).endswith('.npy'):
+        yield from read_chunks(np.load(source, mmap_mode='r'), chunksize)
+    else:
+        raise ValueError('unsupported file type: {}'.format(source))
@@ -0,0 +1,72 @@
+import inspect
+from collections import deque
+from time import perf_counter
+
+from napari.qt.threading import thread_worker
+from qtpy.QtCore import QTimer
+
+
+@thread_worker
+def _run_in_thread(compute, args):
+    yield                                       # a stale job can be cancelled before it starts
+    if inspect.isgeneratorfunction(compute):
+        result = yield from compute(*args)      # generators can also be cancelled at every yield
+    else:
+        result = compute(*args)
+    return result
+
+
+class DebouncedWorker:
+    # Runs compute(*args) in a background thread and hands the result to publish(result)
+    # on the Qt main thread, so the GUI doesn't freeze on big images.
+    # Values that arrive quickly one after the other (e.g. while dragging a slider) are
+    # collected for `delay` ms and only the newest one is computed. A running computation
+    # is cancelled when a newer value arrives and results of old values are never shown.
+    # Collecting values never delays a value by more than `max_latency` ms, and the
+    # measured time from input to display of the last results is kept in `latencies`.
+    def __init__(self, compute, publish, delay=30, max_latency=200):
+        self.compute = compute
+        self.publish = publish
+        self.delay = delay
+        self.max_latency = max_latency
+        self.latencies = deque(maxlen=100)      # time from input to display in seconds
+
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._start)
+        self._pending_args = None
+        self._first_request = None              # time of the oldest value that is not computed yet
+        self._worker = None
+
+    def submit(self, *args):
+        self._pending_args = args
+        now = perf_counter()
+        if self._first_request is None:
+            self._first_request = now
+        waited = (now - self._first_request) * 1000
+        self._timer.start(int(max(0, min(self.delay, self.max_latency - waited))))
+
+    def _start(self):
+        if self._worker is not None:
+            # cancel the computation of an older value; only one computation runs at a
+            # time, the newest value is started as soon as the old one has stopped
+            self._worker.quit()
+            return
+        args, requested = self._pending_args, self._first_request
+        self._pending_args, self._first_request = None, None
+
+        self._worker = _run_in_thread(self.compute, args)
+        self._worker.returned.connect(lambda result: self._on_returned(result, requested))
+        self._worker.finished.connect(self._on_finished)
+        self._worker.start()
+
+    def _on_returned(self, result, requested):
+        if self._pending_args is not None:
+            return                              # a newer value is waiting, this result is stale
+        self.publish(result)
+        self.latencies.append(perf_counter() - requested)
+
+    def _on_finished(self):
+        self._worker = None
+        if self._pending_args is not None and not self._timer.isActive():
+            self._start()
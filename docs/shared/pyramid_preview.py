@@ -0,0 +1,102 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+
+def build_pyramid(image, min_size=256, rgb=False):
+    # Multiscale image layers (a list of arrays from large to small) bring their own
+    # levels. Other images are downsampled by taking every 2nd, 4th, 8th... pixel in y
+    # and x; these are views on the original image, so they don't need memory.
+    # For RGB(A) images y and x are the two axes before the colour channels.
+    if isinstance(image, Sequence):
+        return list(image)
+    yx = _yx_axes(image, rgb)
+    step = tuple(slice(None, None, 2) if axis in yx else slice(None) for axis in range(image.ndim))
+    levels = [image]
+    while min(levels[-1].shape[axis] for axis in yx) >= 2 * min_size:
+        levels.append(levels[-1][step])
+    return levels
+
+
+def level_factors(pyramid, rgb=False):
+    # how much smaller every level is in y and x: exactly 2**level for the strided
+    # levels of build_pyramid (e.g. 499 -> 250 pixels is a factor of 2, not 1.996), and
+    # the rounded size ratio for the levels of a multiscale image
+    yx = _yx_axes(pyramid[0], rgb)
+    return [round(pyramid[0].shape[yx[-1]] / level.shape[yx[-1]]) for level in pyramid]
+
+
+def preview_level(pyramid, max_pixels=1024**2, rgb=False):
+    # the largest level that is small enough to be computed while dragging
+    yx = _yx_axes(pyramid[0], rgb)
+    for level, image in enumerate(pyramid):
+        if np.prod([image.shape[axis] for axis in yx]) <= max_pixels:
+            return level
+    return len(pyramid) - 1
+
+
+def _yx_axes(image, rgb):
+    return (image.ndim - 3, image.ndim - 2) if rgb else (image.ndim - 2, image.ndim - 1)
+
+
+class PyramidPreview:
+    # While a value is changing (e.g. dragging a slider), compute(image, *args) runs on a
+    # downsampled level of the image for quick feedback. The full resolution is computed
+    # when update(..., final=True) is called (e.g. when the slider is released) or when
+    # the value didn't change for `settle_delay` ms. publish(result, scale) gets every
+    # result together with the layer scale that puts it on top of the full image: the
+    # scale of the source layer (update(..., scale=layer.scale)), with y and x
+    # multiplied by the downsampling factor of the level.
+    def __init__(self, compute, publish, max_preview_pixels=1024**2, settle_delay=300):
+        # Qt is only imported here, so that the pyramid functions above also work without it
+        from qtpy.QtCore import QTimer
+        from debounced_worker import DebouncedWorker
+
+        self.compute = compute
+        self.publish = publish
+        self.max_preview_pixels = max_preview_pixels
+        self.pyramid = None
+        self._factors = None
+        self._source = None
+        self._rgb = False
+        self._args = None
+        self._scale = None
+
+        self._worker = DebouncedWorker(self._compute_level, self._publish_level)
+        self._settle_timer = QTimer()
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.setInterval(settle_delay)
+        self._settle_timer.timeout.connect(self._compute_full_resolution)
+
+    def update(self, image, *args, final=False, scale=None, rgb=False):
+        # scale and rgb are the ones of the image layer, e.g. layer.scale and layer.rgb
+        if image is not self._source or rgb != self._rgb:
+            self._source = image
+            self._rgb = rgb
+            self.pyramid = build_pyramid(image, rgb=rgb)
+            self._factors = level_factors(self.pyramid, rgb)
+        self._args = args
+        # napari layer scales don't include the colour axis of RGB images
+        n_spatial = self.pyramid[0].ndim - (1 if rgb else 0)
+        self._scale = tuple(scale) if scale is not None else (1.0,) * n_spatial
+
+        if final:
+            self._settle_timer.stop()
+            self._worker.submit(0, args, self._scale)
+        else:
+            self._worker.submit(preview_level(self.pyramid, self.max_preview_pixels, rgb), args,
+                                self._scale)
+            self._settle_timer.start()
+
+    def _compute_full_resolution(self):
+        self._worker.submit(0, self._args, self._scale)
+
+    def _compute_level(self, level, args, scale):
+        image = self.pyramid[level]
+        result = self.compute(image, *args)
+        factor = self._factors[level]
+        scale = scale[:-2] + tuple(value * factor for value in scale[-2:])
+        return(result, scale)
+
+    def _publish_level(self, result_and_scale):
+        self.publish(*result_and_scale)
@@ -0,0 +1,139 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+import json
+import os
+import threading
+from time import perf_counter
+
+import numpy as np
+from qtpy.QtCore import QTimer
+from qtpy.QtGui import QColor
+from qtpy.QtWidgets import QFileDialog, QPushButton, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget
+
+# Profiling is off unless enable_profiling(viewer) is called, e.g. by starting a script
+# with the environment variable PROFILE_WIDGETS=1. While it is off, measure() does nothing.
+_profiler = None
+
+
+class WidgetProfiler:
+    # Collects how long every step (compute, layer assignment, redraw) of every widget
+    # callback takes. The last max_samples durations per widget and step are kept for
+    # percentiles, the last max_events steps are kept for a Chrome trace.
+    def __init__(self, max_samples=500, max_events=100000):
+        self.samples = defaultdict(lambda: deque(maxlen=max_samples))   # (widget, step) -> ms
+        self.events = deque(maxlen=max_events)
+        self.pending_redraws = {}                                        # widget -> start time
+        self._start = perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, widget, step):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(widget, step, start, perf_counter())
+
+    def record(self, widget, step, start, end):
+        with self._lock:
+            self.samples[(widget, step)].append((end - start) * 1000)
+            self.events.append({'name': step, 'cat': widget, 'ph': 'X', 'pid': os.getpid(),
+                                'tid': threading.get_ident(),
+                                'ts': (start - self._start) * 1e6, 'dur': (end - start) * 1e6})
+
+    def redraw_pending(self, widget):
+        # the layer of this widget changed, the next draw of the canvas is its redraw
+        self.pending_redraws.setdefault(widget, perf_counter())
+
+    def on_draw(self, event=None):
+        end = perf_counter()
+        for widget, start in self.pending_redraws.items():
+            self.record(widget, 'redraw', start, end)
+        self.pending_redraws.clear()
+
+    def percentiles(self, percentiles=(50, 90, 99)):
+        # {(widget, step): [p50, p90, p99]} in ms
+        with self._lock:
+            return {key: np.percentile(list(durations), percentiles)
+                    for key, durations in self.samples.items() if durations}
+
+    def export_chrome_trace(self, filename):
+        # open the file in chrome://tracing or https://ui.perfetto.dev
+        with self._lock:
+            events = list(self.events)
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def enable_profiling(viewer, frame_budget=50):
+    # starts profiling and adds a dock panel with the percentiles to the viewer;
+    # calling it again returns the profiler that is already running
+    global _profiler
+    if _profiler is not None:
+        return _profiler
+    _profiler = WidgetProfiler()
+
+    # napari 0.4 gives us the vispy canvas directly, newer versions wrap it
+    canvas = viewer.window._qt_viewer.canvas
+    canvas = getattr(canvas, '_scene_canvas', canvas)
+    canvas.events.draw.connect(_profiler.on_draw)
+
+    viewer.window.add_dock_widget(ProfilerPanel(_profiler, frame_budget), name='widget profiler', area='right')
+    return _profiler
+
+
+def measure(widget, step):
+    if _profiler is None:
+        return nullcontext()
+    return _profiler.measure(widget, step)
+
+
+def redraw_pending(widget):
+    if _profiler is not None:
+        _profiler.redraw_pending(widget)
+
+
+def profiled(function, widget, step='compute'):
+    # the same function, but measured every time it is called (also in worker threads)
+    def profiled_function(*args, **kwargs):
+        with measure(widget, step):
+            return function(*args, **kwargs)
+    return profiled_function
+
+
+class ProfilerPanel(QWidget):
+    # table with p50/p90/p99 in ms per widget and step; rows slower than the frame
+    # budget (in ms) at p90 are red
+    def __init__(self, profiler, frame_budget=50, interval=500):
+        super().__init__()
+        self.profiler = profiler
+        self.frame_budget = frame_budget
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(['widget', 'step', 'p50', 'p90', 'p99'])
+        self.export_button = QPushButton('Export Chrome trace...')
+        self.export_button.clicked.connect(self.export)
+
+        self.setLayout(QVBoxLayout())
+        self.layout().addWidget(self.table)
+        self.layout().addWidget(self.export_button)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_table)
+        self.timer.start(interval)
+
+    def update_table(self):
+        rows = sorted(self.profiler.percentiles().items())
+        self.table.setRowCount(len(rows))
+        for row, ((widget, step), values) in enumerate(rows):
+            texts = [widget, step] + ['{:.1f}'.format(value) for value in values]
+            for column, text in enumerate(texts):
+                item = QTableWidgetItem(text)
+                if values[1] > self.frame_budget:
+                    item.setBackground(QColor('darkred'))
+                self.table.setItem(row, column, item)
+
+    def export(self):
+        filename, _ = QFileDialog.getSaveFileName(self, 'Export Chrome trace', 'trace.json', '*.json')
+        if filename:
+            self.profiler.export_chrome_trace(filename)
@@ -0,0 +1,187 @@
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+import tempfile
+import threading
+
+# Incremental, parallel copy between the (read-only) fileserver folder and the project
+# space on the cluster, with the same interface as biapol_taurus' ProjectFileTransfer:
+#
+#   pst = ProjectSync("/grp/<fileserver_group>/path/to/your/data/", "/scratch/ws/0/username-cache")
+#   pst.sync_from_fileserver()      # or sync_from_fileserver(lazy=True), see below
+#   imread = pst.imread
+#   ...
+#   pst.sync_to_fileserver()
+#
+# Files are compared in chunks of chunk_size bytes. A manifest in the cache folder
+# keeps the size, modification time and chunk hashes of every file on both sides, so
+# a file that didn't change (same size and modification time as in the manifest) is
+# skipped without reading it, and of a changed file only the chunks that differ are
+# written. Several files are transferred at the same time (n_streams).
+#
+# With lazy=True nothing is copied up front: a file is fetched the first time it is
+# read with imread (or fetch), so the analysis can start right away.
+#
+# Both folders can be any local folders, e.g. two temporary directories for testing.
+
+MANIFEST_NAME = '.project_sync_manifest.json'
+
+
+class ProjectSync:
+    def __init__(self, fileserver_path, cache_path, chunk_size=4 * 2**20, n_streams=8):
+        self.fileserver_path = Path(fileserver_path)
+        self.cache_path = Path(cache_path)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.n_streams = n_streams
+
+        self._manifest_path = self.cache_path / MANIFEST_NAME
+        self._manifest = {'chunk_size': chunk_size, 'fileserver': {}, 'cache': {}}
+        if self._manifest_path.exists():
+            manifest = json.loads(self._manifest_path.read_text())
+            # hashes of chunks of another size can't be compared
+            if manifest.get('chunk_size') == chunk_size:
+                self._manifest = manifest
+        self._lock = threading.Lock()
+        # one lock per file, so that a file is never fetched twice at the same time
+        self._file_locks = {}
+
+    def sync_from_fileserver(self, lazy=False):
+        # copy new and changed files from the fileserver to the cache. With lazy=True
+        # files are only copied when they are read for the first time.
+        if lazy:
+            return []
+        return self._sync_all(self.fileserver_path, 'fileserver', self.cache_path, 'cache')
+
+    def sync_to_fileserver(self):
+        # copy new and changed files (e.g. results) from the cache to the fileserver
+        return self._sync_all(self.cache_path, 'cache', self.fileserver_path, 'fileserver')
+
+    def fetch(self, filename):
+        # make sure a file from the fileserver is up to date in the cache and return
+        # its path in the cache
+        relative = self._relative(filename)
+        with self._lock:
+            file_lock = self._file_locks.setdefault(relative, threading.Lock())
+        with file_lock:
+            source = self.fileserver_path / relative
+            if source.exists():
+                self._sync_file(relative, self.fileserver_path, 'fileserver',
+                                self.cache_path, 'cache')
+                self._save_manifest()
+        return self.cache_path / relative
+
+    def imread(self, filename):
+        # read an image from the cache, fetching it from the fileserver if needed
+        from skimage.io import imread
+        return imread(str(self.fetch(filename)))
+
+    def list_files(self):
+        # all files in the cache and, for lazy syncs, the ones that can still be fetched
+        files = set(self._list(self.cache_path)) | set(self._list(self.fileserver_path))
+        return sorted(str(self.cache_path / relative) for relative in files)
+
+    def _relative(self, filename):
+        path = Path(filename)
+        if path.is_absolute():
+            for root in (self.cache_path, self.fileserver_path):
+                if root in path.parents:
+                    return path.relative_to(root).as_posix()
+        return path.as_posix()
+
+    def _list(self, root):
+        if not root.exists():
+            return []
+        return [path.relative_to(root).as_posix() for path in root.rglob('*')
+                if path.is_file() and path.name != MANIFEST_NAME
+                and not path.name.endswith('.project_sync_tmp')]
+
+    def _sync_all(self, source_root, source_side, target_root, target_side):
+        # transfer all files in parallel, returns the files that were changed
+        files = self._list(source_root)
+        with ThreadPoolExecutor(max_workers=self.n_streams) as pool:
+            changed = list(pool.map(
+                lambda relative: self._sync_file(relative, source_root, source_side,
+                                                 target_root, target_side), files))
+        self._save_manifest()
+        return [relative for relative, was_changed in zip(files, changed) if was_changed]
+
+    def _sync_file(self, relative, source_root, source_side, target_root, target_side):
+        # bring one file up to date, returns whether anything had to be written
+        source = source_root / relative
+        target = target_root / relative
+        source_entry = self._valid_entry(source_side, relative, source)
+        target_entry = self._valid_entry(target_side, relative, target)
+        if (source_entry is not None and target_entry is not None
+                and source_entry['chunks'] == target_entry['chunks']):
+            return False
+
+        if target.exists() and target_entry is None:
+            # the target changed since the last sync (or was never synced): hash it
+            target_entry = self._hash_file(target)
+        target_chunks = target_entry['chunks'] if target_entry is not None else []
+
+        # one pass over the source: hash every chunk and write the ones that differ
+        target.parent.mkdir(parents=True, exist_ok=True)
+        chunks = []
+        written = False
+        mode = 'r+b' if target.exists() else 'wb'
+        with open(source, 'rb') as source_file, open(target, mode) as target_file:
+            for index, data in enumerate(iter(lambda: source_file.read(self.chunk_size), b'')):
+                digest = _chunk_hash(data)
+                chunks.append(digest)
+                if index >= len(target_chunks) or target_chunks[index] != digest:
+                    target_file.seek(index * self.chunk_size)
+                    target_file.write(data)
+                    written = True
+            size = source_file.tell()
+            if target_file.seek(0, os.SEEK_END) != size:
+                target_file.truncate(size)
+                written = True
+
+        # like rsync -a: the target gets the modification time of the source
+        source_stat = source.stat()
+        os.utime(target, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+        target_stat = target.stat()
+        with self._lock:
+            self._manifest[source_side][relative] = _entry(source_stat, chunks)
+            self._manifest[target_side][relative] = _entry(target_stat, chunks)
+        return written
+
+    def _valid_entry(self, side, relative, path):
+        # the manifest entry of a file, if the file hasn't changed since it was made
+        with self._lock:
+            entry = self._manifest[side].get(relative)
+        if entry is None or not path.exists():
+            return None
+        stat = path.stat()
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def _hash_file(self, path):
+        with open(path, 'rb') as file:
+            chunks = [_chunk_hash(data)
+                      for data in iter(lambda: file.read(self.chunk_size), b'')]
+        return _entry(path.stat(), chunks)
+
+    def _save_manifest(self):
+        # write to a temporary file first, an interrupted sync keeps the old manifest.
+        # Several threads fetch at the same time: every write gets its own temporary
+        # file, and writing and replacing happen under the lock, so the newest
+        # manifest is the one that stays.
+        with self._lock:
+            with tempfile.NamedTemporaryFile('w', dir=self.cache_path, prefix=MANIFEST_NAME,
+                                             suffix='.project_sync_tmp', delete=False) as temporary:
+                json.dump(self._manifest, temporary)
+            os.replace(temporary.name, self._manifest_path)
+
+
+def _chunk_hash(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _entry(stat, chunks):
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'chunks': chunks}
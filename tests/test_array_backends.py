@@ -0,0 +1,115 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+from skimage import morphology
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'robert_haase' / 'cupy_cucim'))
+
+import array_backends
+
+
+class DeviceArray(np.ndarray):
+    # stands in for the arrays of a GPU library: a numpy array of its own type
+    pass
+
+
+def to_device(array):
+    return np.asarray(array).view(DeviceArray)
+
+
+def to_host(array):
+    return array.view(np.ndarray)
+
+
+def device_numpy():
+    # the numpy-like module of the "device", with results on the device
+    class Numpy:
+        uint8 = np.uint8
+
+        @staticmethod
+        def where(condition, x, y):
+            return to_device(np.where(condition, x, y))
+    return Numpy
+
+
+def device_morphology():
+    # the morphology module of the "device": scikit-image, with results on the device
+    class Morphology:
+        disks = []
+
+        @staticmethod
+        def disk(radius):
+            Morphology.disks.append(radius)
+            return to_device(morphology.disk(radius))
+
+        @staticmethod
+        def white_tophat(image, footprint):
+            return to_device(morphology.white_tophat(to_host(image), footprint))
+
+        @staticmethod
+        def black_tophat(image, footprint):
+            return to_device(morphology.black_tophat(to_host(image), footprint))
+    return Morphology
+
+
+@pytest.fixture
+def device(monkeypatch):
+    monkeypatch.setattr(array_backends, 'backends', [])
+    return array_backends.register_backend(array_backends.Backend(
+        'device', DeviceArray, device_numpy(), device_morphology(), to_device, to_host))
+
+
+def make_image():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 255, (64, 80)).astype(np.uint8)
+
+
+def test_chained_calls_stay_on_the_device(device):
+    image = make_image()
+    on_device = array_backends.to_device(image, 'device')
+    assert array_backends.to_device(on_device, 'device') is on_device
+
+    background_subtracted = array_backends.subtract_background(on_device, 5)
+    label_image, level = array_backends.flood(background_subtracted, 0.5)
+    assert array_backends.get_backend(label_image) is device
+    assert device.transfers == {'to_device': 1, 'to_host': 0}
+
+    result = array_backends.to_host(label_image)
+    assert type(result) is np.ndarray
+    assert device.transfers == {'to_device': 1, 'to_host': 1}
+
+    # the same as with numpy, where nothing is transferred
+    expected, expected_level = array_backends.flood(array_backends.subtract_background(image, 5), 0.5)
+    assert np.array_equal(result, expected) and level == expected_level
+    assert array_backends.numpy_backend.transfers == {'to_device': 0, 'to_host': 0}
+
+
+def test_disks_are_built_once_per_radius(device):
+    on_device = array_backends.to_device(make_image(), 'device')
+    for radius in (5, 3, 5, 5, 3):
+        array_backends.subtract_background(on_device, radius)
+        array_backends.subtract_background(on_device, radius, light_bg=True)
+    assert device.morphology.disks == [5, 3]
+
+
+def test_get_backend_by_name(device):
+    assert array_backends.get_backend('device') is device
+    assert array_backends.get_backend('numpy') is array_backends.numpy_backend
+    with pytest.raises(ValueError):
+        array_backends.get_backend('cupy')
+
+
+def test_clesperanto_without_device():
+    # without an OpenCL device, the backend can be created (on import) but owns no arrays
+    class NoDevice:
+        def push(self, array):
+            raise RuntimeError('clGetPlatformIDs failed: PLATFORM_NOT_FOUND_KHR')
+
+        pull = push
+
+    backend = array_backends.ClesperantoBackend(NoDevice())
+    assert not backend.owns(np.zeros((2, 2)))
+    assert backend.transfers == {'to_device': 0, 'to_host': 0}
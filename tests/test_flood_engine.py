@@ -0,0 +1,79 @@
+import contextlib
+from pathlib import Path
+import sys
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'marcelo_zoccoler' / 'entry_user_interf3' / 'scripts'))
+
+from flood_engine import FloodEngine, write_to_layer
+
+
+class LabelsLayer:
+    # the parts of a napari Labels layer that write_to_layer uses
+    def __init__(self, data):
+        self.data = data
+        self.history_blocked = False
+        self.writes = 0
+
+    @contextlib.contextmanager
+    def block_history(self):
+        self.history_blocked = True
+        yield
+        self.history_blocked = False
+
+    def data_setitem(self, indices, value):
+        assert self.history_blocked
+        self.data[indices] = value
+        self.writes += 1
+
+
+def expected_flood(image, delta):
+    return (image <= delta * 85).astype(np.uint8) * 13
+
+
+def make_image():
+    return np.random.default_rng(0).integers(0, 255, (50, 60, 3))
+
+
+def test_flood_writes_the_label_image_in_place():
+    image = make_image()
+    engine = FloodEngine(image)
+    for delta in (1.0, 2.5, 0.3, 0.3, 3.0, 0):
+        label_image, new_level = engine.flood(delta)
+        assert label_image is engine.label_image
+        assert new_level == delta * 85
+        assert np.array_equal(label_image, expected_flood(image, delta))
+
+
+def test_flood_changes_only_writes_when_applied():
+    # the changes are found in a background thread while the label image is shown;
+    # results that are dropped or applied late never leave it out of step
+    image = make_image()
+    engine = FloodEngine(image)
+    layer = LabelsLayer(engine.label_image)
+    deltas = np.random.default_rng(1).uniform(0, 3, 60)
+    pending = []
+    for index, delta in enumerate(deltas):
+        pending.append(engine.flood_changes(delta))
+        if index < 2:
+            assert not engine.label_image.any()
+        if index % 3 == 2:
+            # publish only one of the results, sometimes an older one
+            changes = pending[index % 2]
+            pending = []
+            write_to_layer(changes, layer)
+            assert layer.data is engine.label_image
+            assert np.array_equal(layer.data, expected_flood(image, changes.new_level / 85))
+    assert layer.writes == len(deltas) // 3
+
+
+def test_flood_changes_are_the_pixels_between_the_levels():
+    image = make_image()
+    engine = FloodEngine(image)
+    engine.flood(1)
+    changes = engine.flood_changes(2)
+    between = (image > 85) & (image <= 170)
+    assert changes.value == 13
+    assert np.array_equal(np.sort(changes.changed), np.flatnonzero(between))
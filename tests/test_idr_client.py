@@ -0,0 +1,115 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+from pathlib import Path
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'robert_haase' / 'browsing_idr'))
+
+from idr_client import IDRClient
+
+# a plate of 2 x 3 wells with one empty well, like webgateway/plate answers
+GRID = {'rowlabels': ['A', 'B'], 'collabels': ['1', '2', '3'],
+        'grid': [[{'id': 11}, None, {'id': 13}], [{'id': 21}, {'id': 22}, {'id': 23}]]}
+
+
+def encoded_image(image_id):
+    # a small png that tells which image it is
+    from imageio.v3 import imwrite
+    buffer = io.BytesIO()
+    imwrite(buffer, np.full((4, 5), image_id, dtype=np.uint8), extension='.png')
+    return buffer.getvalue()
+
+
+class StubServer:
+    # webgateway/plate and webclient/render_image of an Omero server. Every image
+    # fails with a 503 the first time it is requested, and higher image IDs are
+    # answered faster, so that parallel downloads finish out of order.
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests.append(self.path)
+                    n_requests = stub.requests.count(self.path)
+                plate = re.fullmatch(r'/webgateway/plate/(\d+)/(\d+)/', self.path)
+                image = re.fullmatch(r'/webclient/render_image/(\d+)/', self.path)
+                if plate:
+                    self.answer(200, json.dumps(GRID).encode(), 'application/json')
+                elif image and n_requests == 1:
+                    self.answer(503, b'busy', 'text/plain')
+                elif image:
+                    time.sleep(0.05 * (30 - int(image.group(1))) / 30)
+                    self.answer(200, encoded_image(int(image.group(1))), 'image/png')
+                else:
+                    self.answer(404, b'not found', 'text/plain')
+
+            def answer(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_address[1])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def image_requests(self):
+        with self.lock:
+            return [path for path in self.requests if 'render_image' in path]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+def test_well_image_ids(server, tmp_path):
+    with IDRClient(server.url, cache_dir=tmp_path, backoff_factor=0) as client:
+        assert client.well_image_ids(1) == [11, 13, 21, 22, 23]
+
+
+def test_images_are_retried_in_order_and_cached(server, tmp_path):
+    with IDRClient(server.url, cache_dir=tmp_path, max_workers=4, backoff_factor=0) as client:
+        image_ids = client.well_image_ids(1)
+        images = client.images(image_ids)
+
+        # every image failed once with 503 and was retried
+        assert len(server.image_requests()) == 2 * len(image_ids)
+        assert [int(image[0, 0]) for image in images] == image_ids
+        assert sorted(path.name for path in (tmp_path / 'image').iterdir()) == sorted(
+            str(image_id) for image_id in image_ids)
+
+        # the second time everything comes from the cache, without a request
+        cached = client.images(image_ids)
+        assert len(server.image_requests()) == 2 * len(image_ids)
+        assert all(np.array_equal(a, b) for a, b in zip(images, cached))
+
+
+def test_same_image_in_parallel(server, tmp_path):
+    # threads downloading the same image write their own temporary files
+    with IDRClient(server.url, cache_dir=tmp_path, max_workers=8, backoff_factor=0) as client:
+        images = client.images([22] * 16)
+    assert all(int(image[0, 0]) == 22 for image in images)
+    assert [path.name for path in (tmp_path / 'image').iterdir()] == ['22']
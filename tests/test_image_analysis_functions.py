@@ -0,0 +1,176 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+from skimage import filters
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'ryan_savill' / '03_background_subtraction'))
+
+import image_analysis_functions as iaf
+
+TRIBOLIUM = (Path(__file__).resolve().parent.parent / 'docs' / 'ryan_savill'
+             / '03_background_subtraction' / 'MAX_Lund_18.0_22.0_Hours Z-projection t1.tif')
+
+
+def make_image(shape=(200, 230), seed=0):
+    # bright blobs on an uneven background, as float so that both top-hats are signed
+    rng = np.random.default_rng(seed)
+    image = np.zeros(shape)
+    image[tuple(rng.integers(0, n, 60) for n in shape)] = 1000
+    image = ndimage.gaussian_filter(image, 2)
+    return image + np.linspace(0, 300, shape[-1]) + rng.normal(100, 5, shape)
+
+
+def tribolium():
+    from skimage.io import imread
+    return imread(TRIBOLIUM)[256:768].astype(np.float64)
+
+
+# radius: (smallest correlation, largest error relative to the largest value); the
+# octagon approximates the disk well for the radii used on nuclei, small radii are
+# coarser because the octagon's sides are rounded to whole pixels
+TOLERANCES = {3: (0.94, 0.4), 8: (0.99, 0.12), 15: (0.99, 0.08), 25: (0.99, 0.08)}
+
+
+@pytest.mark.parametrize('radius', sorted(TOLERANCES))
+@pytest.mark.parametrize('light_bg', [False, True])
+def test_fast_subtract_background_matches_exact_tophat(radius, light_bg):
+    image = tribolium()
+    if light_bg:
+        image = image.max() - image
+    exact = iaf.subtract_background(image, radius, light_bg)
+    fast = iaf.fast_subtract_background(image, radius, light_bg)
+
+    min_correlation, max_error = TOLERANCES[radius]
+    assert fast.shape == exact.shape
+    assert np.corrcoef(exact.ravel(), fast.ravel())[0, 1] > min_correlation
+    assert np.abs(fast - exact).max() < max_error * np.abs(exact).max()
+
+
+@pytest.mark.parametrize('method', [iaf.subtract_background, iaf.fast_subtract_background])
+def test_tiled_subtract_background_is_identical(method):
+    stack = np.stack([make_image((150, 170), seed) for seed in range(2)]).astype(np.float32)
+    tiled = iaf.tiled_subtract_background(stack, 6, tile_size=40, method=method)
+    whole = np.stack([method(plane, 6) for plane in stack])
+    assert np.array_equal(tiled, whole)
+
+
+def test_tiled_subtract_background_writes_npy(tmp_path):
+    image = make_image((120, 90)).astype(np.float32)
+    output = iaf.tiled_subtract_background(image, 5, output=tmp_path / 'out.npy', tile_size=32)
+    assert np.array_equal(np.load(tmp_path / 'out.npy'), iaf.subtract_background(image, 5))
+    assert np.array_equal(output, iaf.subtract_background(image, 5))
+
+
+def test_subtract_background_batch_matches_single_frames():
+    frames = np.stack([make_image((60, 70), seed) for seed in range(3)])
+    batch = iaf.subtract_background_batch(frames, 5)
+    assert np.array_equal(batch, np.stack([iaf.subtract_background(f, 5) for f in frames]))
+    assert np.array_equal(iaf.subtract_background_batch(list(frames), 5), batch)
+
+
+def test_subtract_background_batch_empty():
+    assert iaf.subtract_background_batch(np.zeros((0, 10, 10)), 5).shape == (0, 10, 10)
+    with pytest.raises(ValueError):
+        iaf.subtract_background_batch([], 5)
+
+
+def test_subtract_background_dog_batch_empty():
+    assert iaf.subtract_background_dog_batch(np.zeros((0, 10, 10)), 1, 3).shape == (0, 10, 10)
+    with pytest.raises(ValueError):
+        iaf.subtract_background_dog_batch([], 1, 3)
+
+
+def test_subtract_background_dog_batch_matches_single_frames():
+    frames = [make_image((64, 50), seed) for seed in range(3)]
+    batch = iaf.subtract_background_dog_batch(frames, 2, 20)
+    assert batch.shape == (3, 64, 50) and batch.dtype == np.float32
+    for frame, frame_result in zip(frames, batch):
+        assert np.array_equal(frame_result, iaf.subtract_background_dog(frame, 2, 20))
+
+
+@pytest.mark.parametrize('sigmas', [(0.05, 0.1), (1, 3), (2, 20)])
+def test_subtract_background_dog_fft_matches_separable(sigmas):
+    # very small sigmas need no padding for the FFT; the sampled and the Fourier
+    # Gaussian are not exactly the same, so they agree to a fraction of the intensities
+    image = make_image((64, 50))
+    separable = iaf.subtract_background_dog(image, *sigmas, dtype=np.float64, method='separable')
+    fft = iaf.subtract_background_dog(image, *sigmas, dtype=np.float64, method='fft')
+    assert fft.shape == image.shape
+    assert np.abs(fft - separable).max() < 0.005 * image.max()
+
+
+class ChunkedOutput(np.ndarray):
+    # an in-memory array with zarr's chunks attribute
+    chunks = None
+
+
+@pytest.mark.parametrize('chunks, fits', [((1, 20, 20), True), ((1, 40, 8), True),
+                                          ((1, 30, 40), False), ((2, 40, 40), False)])
+def test_tiled_subtract_background_checks_chunks(chunks, fits):
+    stack = np.stack([make_image((90, 100), seed) for seed in range(2)]).astype(np.float32)
+    output = np.zeros_like(stack).view(ChunkedOutput)
+    output.chunks = chunks
+    if fits:
+        tiled = iaf.tiled_subtract_background(stack, 4, output=output, tile_size=40)
+        assert np.array_equal(tiled, np.stack([iaf.subtract_background(p, 4) for p in stack]))
+    else:
+        with pytest.raises(ValueError):
+            iaf.tiled_subtract_background(stack, 4, output=output, tile_size=40)
+
+
+@pytest.mark.parametrize('light_bg', [False, True])
+def test_subtract_background_filters_stacks_plane_by_plane(light_bg):
+    stack = np.stack([make_image((40, 40), seed) for seed in range(6)])
+    result = iaf.subtract_background(stack, 5, light_bg)
+    assert np.array_equal(result, iaf.subtract_background_batch(stack, 5, light_bg))
+    assert np.array_equal(result, iaf.tiled_subtract_background(stack, 5, light_bg, tile_size=16))
+
+
+def median_and_otsutresh_reference(image, mediansize, blackbgnd):
+    # the version of the introduction to scikit-image
+    medianimg = ndimage.median_filter(image, mediansize)
+    tresh = filters.threshold_otsu(medianimg)
+    return medianimg > tresh if blackbgnd else medianimg < tresh
+
+
+@pytest.mark.parametrize('shape, mediansize', [((60, 70), 4), ((60, 70), (6, 5)), ((60, 70), 7),
+                                               ((12, 30, 40), (3, 4, 4))])
+@pytest.mark.parametrize('dtype, step', [(np.uint8, 20), (np.uint16, 3000)])
+@pytest.mark.parametrize('blackbgnd', [True, False])
+@pytest.mark.parametrize('output', ['return', 'out', 'packed'])
+def test_histogram_median_and_otsutresh_matches_median_filter(monkeypatch, shape, mediansize, dtype,
+                                                              step, blackbgnd, output):
+    # few intensity levels, so that the histogram median is used instead of median_filter
+    image = make_image(shape)
+    image = (np.round(image / image.max() * 11) * step).astype(dtype)
+    monkeypatch.setattr(iaf, 'median_filter', None)
+    expected = median_and_otsutresh_reference(image, mediansize, blackbgnd)
+
+    if output == 'return':
+        result = iaf.median_and_otsutresh(image, mediansize, blackbgnd)
+    elif output == 'out':
+        out = np.empty(shape, dtype=bool)
+        result = iaf.median_and_otsutresh(image, mediansize, blackbgnd, out=out)
+        assert result is out
+    else:
+        out = np.empty(shape[:-1] + ((shape[-1] + 7) // 8,), dtype=np.uint8)
+        result = iaf.median_and_otsutresh(image, mediansize, blackbgnd, out=out, packed=True)
+        assert result is out
+        result = np.unpackbits(result, axis=-1, count=shape[-1]).astype(bool)
+    assert expected.any() and not expected.all()
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.float64])
+def test_median_and_otsutresh_without_histogram_median(dtype):
+    image = make_image((60, 70))
+    image = (image / image.max() * 255).astype(dtype)
+    for blackbgnd in (True, False):
+        expected = median_and_otsutresh_reference(image, 3, blackbgnd)
+        assert np.array_equal(iaf.median_and_otsutresh(image, 3, blackbgnd), expected)
+        packed = iaf.median_and_otsutresh(image, 3, blackbgnd, packed=True)
+        assert np.array_equal(np.unpackbits(packed, axis=-1, count=70).astype(bool), expected)
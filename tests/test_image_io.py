@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'ryan_savill' / '03_background_subtraction'))
+
+from image_io import PrefetchedArray, create_image, open_image
+
+
+def make_stack(n_planes=12):
+    return np.arange(n_planes * 6 * 7, dtype=np.uint16).reshape(n_planes, 6, 7)
+
+
+def test_open_and_create_npy(tmp_path):
+    stack = make_stack()
+    output = create_image(tmp_path / 'stack.npy', stack.shape, stack.dtype)
+    output[...] = stack
+    output.flush()
+    assert np.array_equal(open_image(tmp_path / 'stack.npy'), stack)
+    with pytest.raises(ValueError):
+        create_image(stack, (1, 2, 3), stack.dtype)
+
+
+def test_prefetched_indexing():
+    stack = make_stack()
+    with PrefetchedArray(stack, n_ahead=3) as prefetched:
+        assert prefetched.shape == stack.shape and len(prefetched) == len(stack)
+        assert np.array_equal(prefetched[5], stack[5])
+        assert np.array_equal(prefetched[np.int64(2), 1:3], stack[2, 1:3])
+        assert np.array_equal(prefetched[-1], stack[-1])
+        assert np.array_equal(prefetched[-12], stack[0])
+        assert np.array_equal(prefetched[2:4], stack[2:4])
+        assert np.array_equal(np.asarray(prefetched), stack)
+        assert np.array_equal(np.stack(list(prefetched)), stack)
+
+
+@pytest.mark.parametrize('index', [12, 13, -13, -100])
+def test_prefetched_index_out_of_range(index):
+    with PrefetchedArray(make_stack()) as prefetched:
+        with pytest.raises(IndexError):
+            prefetched[index]
+
+
+def test_prefetched_from_several_threads():
+    # threads reading different parts of the stack drop each other's prefetched planes
+    stack = make_stack(64)
+    indices = np.random.default_rng(0).integers(0, len(stack), 2000)
+    with PrefetchedArray(stack, n_ahead=2, n_workers=2) as prefetched:
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            planes = list(pool.map(prefetched.__getitem__, indices))
+    assert all(np.array_equal(plane, stack[index]) for plane, index in zip(planes, indices))
@@ -0,0 +1,72 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+from scipy import ndimage
+from skimage.measure import label, regionprops_table
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'ryan_savill' / 'principal_feature_analysis'))
+
+import label_measurements
+from label_measurements import measure_labels
+
+PROPERTIES = ('label', 'area', 'bbox', 'centroid', 'axis_major_length', 'axis_minor_length',
+              'intensity_mean', 'intensity_min', 'intensity_max', 'centroid_weighted')
+
+
+def make_labels(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    intensity = ndimage.gaussian_filter(rng.random(shape), 2)
+    return label(intensity > np.percentile(intensity, 70)), intensity
+
+
+@pytest.mark.parametrize('shape', [(60, 70), (24, 30, 36)])
+def test_measure_labels_matches_regionprops(shape):
+    labels, intensity = make_labels(shape)
+    # small slabs, so that the partial results of many tiles are merged
+    table = measure_labels(labels, intensity, tile_voxels=500, n_workers=4)
+    expected = regionprops_table(labels, intensity, properties=PROPERTIES)
+
+    assert np.array_equal(table.labels, expected['label'])
+    for column, values in expected.items():
+        if column == 'label':
+            continue
+        column = column.replace('centroid_weighted', 'weighted_centroid')
+        assert np.allclose(table[column], values), column
+
+
+def test_no_axis_lengths_in_4d():
+    labels, _ = make_labels((6, 8, 8, 8))
+    table = measure_labels(labels)
+    assert 'axis_major_length' not in table.columns
+    assert 'centroid-3' in table.columns
+
+
+@pytest.mark.parametrize('shape, tile_voxels, n_slabs', [
+    ((60, 70), 7 * 70, 9), ((24, 30, 36), 5 * 30 * 36, 5), ((24, 30, 36), 100, 24)])
+def test_slabs_have_about_tile_voxels_pixels(monkeypatch, shape, tile_voxels, n_slabs):
+    labels, _ = make_labels(shape)
+    slabs = []
+    measure_tile = label_measurements._measure_tile
+
+    def record(label_image, intensity_image, start, tile_size, n_labels):
+        slabs.append(label_image[start:start + tile_size].shape)
+        return measure_tile(label_image, intensity_image, start, tile_size, n_labels)
+
+    monkeypatch.setattr(label_measurements, '_measure_tile', record)
+    measure_labels(labels, tile_voxels=tile_voxels)
+    assert len(slabs) == n_slabs
+    assert all(np.prod(slab) <= max(tile_voxels, np.prod(shape[1:])) for slab in slabs)
+
+
+def test_array_copies_only_when_asked():
+    labels, intensity = make_labels((60, 70))
+    table = measure_labels(labels, intensity)
+    assert np.asarray(table) is table.data
+    copied = np.array(table)
+    assert copied is not table.data and np.array_equal(copied, table.data)
+    assert np.asarray(table, dtype=np.float32).dtype == np.float32
+    with pytest.raises(ValueError):
+        np.array(table, dtype=np.float32, copy=False)
@@ -0,0 +1,119 @@
+from pathlib import Path
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'johannes_mueller' / 'yolo_from_omero'))
+
+OBJECT_CLASSES = {'cell': 0, 'debris': 1}
+
+
+class FakeOmero:
+    # the ezomero calls of omero_yolo_export on an in-memory dataset of n_images images
+    # with one rectangle each. Every call records the connection and the thread it was
+    # made from; get_image raises for the image IDs in fail.
+    def __init__(self, n_images=20):
+        self.images = {100 + i: np.full((1, 1, 1, 30, 40), i, dtype=np.uint8) for i in range(n_images)}
+        self.fail = set()
+        self.downloaded = []
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def record(self, conn):
+        with self.lock:
+            self.calls.append((conn, threading.get_ident()))
+
+    def get_image_ids(self, conn, dataset):
+        self.record(conn)
+        return list(self.images)
+
+    def get_image(self, conn, image_id, dim_order):
+        self.record(conn)
+        if image_id in self.fail:
+            raise ConnectionError('lost the connection while downloading {}'.format(image_id))
+        with self.lock:
+            self.downloaded.append(image_id)
+        return types.SimpleNamespace(name='image_{}'.format(image_id)), self.images[image_id]
+
+    def get_roi_ids(self, conn, image_id):
+        self.record(conn)
+        return [image_id]
+
+    def get_shape_ids(self, conn, roi_id):
+        self.record(conn)
+        return [roi_id]
+
+    def get_shape(self, conn, shape_id):
+        self.record(conn)
+        return types.SimpleNamespace(x=4, y=3, width=8, height=6,
+                                     label='cell' if shape_id % 2 else 'debris')
+
+
+@pytest.fixture
+def omero(monkeypatch):
+    fake = FakeOmero()
+    module = types.ModuleType('ezomero')
+    for name in ('get_image_ids', 'get_image', 'get_roi_ids', 'get_shape_ids', 'get_shape'):
+        setattr(module, name, getattr(fake, name))
+    monkeypatch.setitem(sys.modules, 'ezomero', module)
+    monkeypatch.delitem(sys.modules, 'omero_yolo_export', raising=False)
+    import omero_yolo_export
+    fake.export = omero_yolo_export
+    return fake
+
+
+def exported_files(folder):
+    return sorted(path.relative_to(folder).as_posix() for path in Path(folder).rglob('*')
+                  if path.is_file())
+
+
+def test_export_dataset(omero, tmp_path):
+    connections = iter(range(1000))
+    splits = omero.export.export_dataset('main', 1, tmp_path, OBJECT_CLASSES, max_workers=4,
+                                         connect=lambda: next(connections))
+
+    assert sorted(splits) == sorted(omero.images)
+    files = exported_files(tmp_path)
+    for img_id, split in splits.items():
+        assert '{}/images/image_{}.png'.format(split, img_id) in files
+        assert '{}/labels/image_{}.txt'.format(split, img_id) in files
+    label = (tmp_path / splits[101] / 'labels' / 'image_101.txt').read_text()
+    assert [float(value) for value in label.split()] == [0, 0.2, 0.2, 0.2, 0.2]
+
+    # every connection that was opened is only used from one thread
+    threads = {}
+    for conn, thread in omero.calls:
+        if conn != 'main':
+            assert threads.setdefault(conn, thread) == thread
+
+
+def test_export_dataset_without_connect_uses_one_thread(omero, tmp_path):
+    omero.export.export_dataset('main', 1, tmp_path, OBJECT_CLASSES, max_workers=8)
+    # the image IDs are listed in the calling thread, the images downloaded in one worker
+    assert len({thread for conn, thread in omero.calls[1:]}) == 1
+
+
+def test_export_dataset_resumes_after_interruption(omero, tmp_path):
+    failing = sorted(omero.images)[12]
+    omero.fail.add(failing)
+    with pytest.raises(ConnectionError):
+        omero.export.export_dataset('main', 1, tmp_path, OBJECT_CLASSES)
+
+    # no half written files, and only finished images are marked as done
+    files = exported_files(tmp_path)
+    assert not any('.part' in name for name in files)
+    done = [int(line) for line in (tmp_path / omero.export.DONE_FILE).read_text().split()]
+    assert failing not in done
+    for img_id in done:
+        assert any(name.endswith('image_{}.png'.format(img_id)) for name in files)
+
+    # the second run only downloads the images that are not done yet
+    omero.fail.clear()
+    omero.downloaded.clear()
+    splits = omero.export.export_dataset('main', 1, tmp_path, OBJECT_CLASSES)
+    assert sorted(omero.downloaded) == sorted(set(omero.images) - set(done))
+    assert len(exported_files(tmp_path)) == 2 * len(splits) + 1
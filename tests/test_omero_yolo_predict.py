@@ -0,0 +1,159 @@
+from pathlib import Path
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+from skimage import io
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'johannes_mueller' / 'yolo_from_omero'))
+
+CLASS_NAMES = {0: 'cell', 1: 'debris'}
+
+
+class Tensor:
+    # the parts of a torch tensor that omero_yolo_predict uses
+    def __init__(self, array):
+        self.array = np.asarray(array)
+
+    def detach(self):
+        return self
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+def fake_torch():
+    module = types.ModuleType('torch')
+    module.cat = lambda tensors: Tensor(np.concatenate([tensor.array for tensor in tensors]))
+    return module
+
+
+class Boxes:
+    # the boxes of one YOLO result
+    def __init__(self, xywh, cls):
+        self.xywh = xywh
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.xywh.array)
+
+
+class FakeModel:
+    # a YOLO model that finds index % 3 boxes in the index-th image, centered at
+    # (10 * index + box + 5, 20) with a size of 10 x 6
+    def __init__(self, image_files):
+        self.index = {image_file: index for index, image_file in enumerate(image_files)}
+        self.batches = []
+
+    def boxes(self, image_file):
+        index = self.index[image_file]
+        xywh = [[10 * index + box + 5, 20, 10, 6] for box in range(index % 3)]
+        return Boxes(Tensor(np.reshape(xywh, (-1, 4)).astype(np.float32)),
+                     Tensor(np.arange(index % 3) % 2 * 1.0))
+
+    def __call__(self, batch, device, verbose):
+        assert device == 'cpu'
+        self.batches.append(list(batch))
+        return [types.SimpleNamespace(boxes=self.boxes(image_file)) for image_file in batch]
+
+
+class FakeOmero:
+    # the ezomero calls of omero_yolo_predict; every call records the connection and
+    # the thread it was made from
+    def __init__(self):
+        self.images = {}
+        self.rois = {}
+        self.calls = []
+        self.lock = threading.Lock()
+        self.rectangle = lambda x, y, width, height, label: (x, y, width, height, label)
+
+    def record(self, conn):
+        with self.lock:
+            self.calls.append((conn, threading.get_ident()))
+            return len(self.calls)
+
+    def post_image(self, conn, image, dim_order, dataset_id, image_name):
+        image_id = self.record(conn)
+        self.images[image_id] = image_name
+        return image_id
+
+    def post_roi(self, conn, image_id, shapes):
+        roi_id = self.record(conn)
+        self.rois[image_id] = shapes
+        return roi_id
+
+
+@pytest.fixture
+def omero(monkeypatch):
+    fake = FakeOmero()
+    module = types.ModuleType('ezomero')
+    module.post_image = fake.post_image
+    module.post_roi = fake.post_roi
+    module.rois = types.SimpleNamespace(Rectangle=fake.rectangle)
+    monkeypatch.setitem(sys.modules, 'ezomero', module)
+    monkeypatch.setitem(sys.modules, 'torch', fake_torch())
+    monkeypatch.delitem(sys.modules, 'omero_yolo_predict', raising=False)
+    import omero_yolo_predict
+    fake.predict = omero_yolo_predict
+    return fake
+
+
+def make_image_files(folder, n_images=11):
+    image_files = []
+    for index in range(n_images):
+        image_file = str(Path(folder) / 'image_{:02d}.png'.format(index))
+        io.imsave(image_file, np.full((30, 40), index, dtype=np.uint8), check_contrast=False)
+        image_files.append(image_file)
+    return image_files
+
+
+def test_predict_splits_the_batched_boxes(omero, tmp_path):
+    image_files = make_image_files(tmp_path)
+    model = FakeModel(image_files)
+    predictions = list(omero.predict.predict(model, image_files, batch_size=4))
+
+    assert [len(batch) for batch in model.batches] == [4, 4, 3]
+    assert [image_file for image_file, _, _ in predictions] == image_files
+    for index, (image_file, boxes, classes) in enumerate(predictions):
+        # the centers of the boxes become their top left corners
+        corners = [[10 * index + box, 17, 10, 6] for box in range(index % 3)]
+        assert np.array_equal(boxes, np.reshape(corners, (-1, 4)))
+        assert classes.dtype.kind == 'i'
+        assert np.array_equal(classes, np.arange(index % 3) % 2)
+
+
+def test_predict_and_upload(omero, tmp_path):
+    image_files = make_image_files(tmp_path)
+    connections = iter(range(1000))
+    uploaded = omero.predict.predict_and_upload('main', FakeModel(image_files), image_files, CLASS_NAMES,
+                                                dataset_id=1, batch_size=4, max_workers=4,
+                                                connect=lambda: next(connections))
+
+    assert [omero.images[image_id] for image_id, _ in uploaded] == [
+        'image_{:02d}'.format(index) for index in range(len(image_files))]
+    for index, (image_id, roi_id) in enumerate(uploaded):
+        if index % 3 == 0:
+            assert roi_id is None and image_id not in omero.rois
+        else:
+            assert omero.rois[image_id] == [(10 * index + box, 17, 10, 6, CLASS_NAMES[box % 2])
+                                            for box in range(index % 3)]
+
+    # every connection is only used from one thread, and never the one of the caller
+    threads = {}
+    for conn, thread in omero.calls:
+        assert conn != 'main'
+        assert threads.setdefault(conn, thread) == thread
+
+
+def test_predict_and_upload_without_connect_uses_one_thread(omero, tmp_path):
+    image_files = make_image_files(tmp_path)
+    omero.predict.predict_and_upload('main', FakeModel(image_files), image_files, CLASS_NAMES,
+                                     dataset_id=1, max_workers=4)
+    assert {conn for conn, thread in omero.calls} == {'main'}
+    assert len({thread for conn, thread in omero.calls}) == 1
@@ -0,0 +1,80 @@
+from collections import defaultdict
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'ryan_savill' / 'principal_feature_analysis'))
+
+from pfa import PFA, closest_to_centers
+
+
+def make_table(n_objects=500, seed=0):
+    # 12 features that are noisy mixtures of 4 independent ones
+    rng = np.random.default_rng(seed)
+    sources = rng.normal(size=(n_objects, 4))
+    mixing = rng.normal(size=(4, 12))
+    return sources @ mixing + 0.1 * rng.normal(size=(n_objects, 12))
+
+
+def readme_indices(points, clusters, cluster_centers):
+    # the loop of the blog post
+    from sklearn.metrics.pairwise import euclidean_distances
+    dists = defaultdict(list)
+    for i, c in enumerate(clusters):
+        dist = euclidean_distances([points[i, :]], [cluster_centers[c, :]])[0][0]
+        dists[c].append((i, dist))
+    return [sorted(f, key=lambda x: x[1])[0][0] for f in dists.values()]
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_closest_to_centers_matches_readme(seed):
+    rng = np.random.default_rng(seed)
+    points = rng.normal(size=(40, 3))
+    clusters = rng.integers(0, 7, 40)
+    clusters[:7] = rng.permutation(7)         # every cluster has a point, in shuffled order
+    cluster_centers = rng.normal(size=(7, 3))
+    points[30] = cluster_centers[clusters[30]]   # a point on its center
+    assert closest_to_centers(points, clusters, cluster_centers).tolist() == readme_indices(
+        points, clusters, cluster_centers)
+
+
+def test_pfa_selects_features():
+    pfa = PFA(random_state=0).fit(make_table())
+    assert len(set(pfa.indices_)) == len(pfa.indices_)
+    assert pfa.features_.shape == (500, len(pfa.indices_))
+
+
+def test_randomized_solver_needs_q():
+    with pytest.raises(ValueError):
+        PFA(svd_solver='randomized').fit(make_table())
+    pfa = PFA(q=4, svd_solver='randomized', random_state=0).fit(make_table())
+    assert pfa.components_.shape == (4, 12)
+
+
+@pytest.mark.parametrize('chunksize', [37, 100, 500])
+def test_fit_chunks_matches_fit(chunksize):
+    from pfa import read_chunks
+    table = make_table()
+    pfa = PFA(random_state=0).fit(table)
+    streamed = PFA(random_state=0).fit_chunks(read_chunks(table, chunksize))
+    assert streamed.n_samples_seen_ == len(table)
+    assert np.allclose(streamed.explained_variance_ratio_, pfa.explained_variance_ratio_)
+    # the same components up to their sign, which also changes the clustering
+    assert np.allclose(np.abs(streamed.components_), np.abs(pfa.components_), atol=1e-6)
+
+
+def test_refit_forgets_feature_names():
+    pd = pytest.importorskip('pandas')
+    table = make_table()
+    frame = pd.DataFrame(table, columns=['feature_{}'.format(i) for i in range(12)])
+    pfa = PFA(random_state=0).fit(frame)
+    assert pfa.feature_names_ == list(frame.columns)
+    pfa.fit_chunks([table[:250], table[250:]])
+    assert not hasattr(pfa, 'feature_names_')
+    pfa.fit_chunks([frame[:250], frame[250:]])
+    assert pfa.feature_names_ == list(frame.columns)
+    pfa.fit(table)
+    assert not hasattr(pfa, 'feature_names_')
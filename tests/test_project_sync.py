@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'till_korten' / 'devbio-napari_cluster'))
+
+from project_sync import MANIFEST_NAME, ProjectSync
+
+
+def make_files(folder, n_files=12, size=3000):
+    # files of a few chunks each, in sub folders
+    for index in range(n_files):
+        path = Path(folder) / 'folder_{}'.format(index % 3) / 'image_{:02d}.tif'.format(index)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(os.urandom(size + index))
+
+
+def relative_files(folder):
+    return sorted(path.relative_to(folder).as_posix() for path in Path(folder).rglob('*')
+                  if path.is_file())
+
+
+def assert_same_files(fileserver, cache):
+    files = relative_files(fileserver)
+    assert [name for name in relative_files(cache) if name != MANIFEST_NAME] == files
+    for name in files:
+        assert (Path(fileserver) / name).read_bytes() == (Path(cache) / name).read_bytes()
+
+
+def test_sync_between_local_folders(tmp_path):
+    fileserver, cache = tmp_path / 'fileserver', tmp_path / 'cache'
+    make_files(fileserver)
+    sync = ProjectSync(fileserver, cache, chunk_size=1024, n_streams=4)
+
+    assert len(sync.sync_from_fileserver()) == 12
+    assert_same_files(fileserver, cache)
+    assert sync.sync_from_fileserver() == []
+
+    # only the edited file is written, a new manifest sees the same state
+    with open(fileserver / 'folder_1' / 'image_04.tif', 'r+b') as file:
+        file.seek(1500)
+        file.write(b'edited')
+    assert ProjectSync(fileserver, cache, chunk_size=1024).sync_from_fileserver() == [
+        'folder_1/image_04.tif']
+    assert_same_files(fileserver, cache)
+
+    # results written in the cache go back to the fileserver
+    (cache / 'results').mkdir()
+    (cache / 'results' / 'labels.tif').write_bytes(b'labels')
+    assert sync.sync_to_fileserver() == ['results/labels.tif']
+    assert (fileserver / 'results' / 'labels.tif').read_bytes() == b'labels'
+
+
+def test_concurrent_fetches(tmp_path):
+    # 200 lazy fetches from 16 threads, many of them of the same file, all saving the
+    # manifest at the same time
+    fileserver, cache = tmp_path / 'fileserver', tmp_path / 'cache'
+    make_files(fileserver)
+    sync = ProjectSync(fileserver, cache, chunk_size=1024)
+    assert sync.sync_from_fileserver(lazy=True) == []
+
+    files = relative_files(fileserver)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        paths = list(pool.map(sync.fetch, [files[index % len(files)] for index in range(200)]))
+
+    assert paths[:len(files)] == [cache / name for name in files]
+    assert_same_files(fileserver, cache)
+    manifest = json.loads((cache / MANIFEST_NAME).read_text())
+    assert sorted(manifest['cache']) == files
+    assert sorted(manifest['fileserver']) == files
@@ -0,0 +1,54 @@
+from pathlib import Path
+import sys
+
+import numpy as np
+from skimage import measure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent
+                       / 'docs' / 'ryan_savill' / '03_background_subtraction'))
+
+import image_analysis_functions as iaf
+from segmentation_pipeline import Pipeline, Step, segmentation_pipeline
+from test_image_analysis_functions import make_image
+
+
+def scale(image, factor):
+    return image * factor
+
+
+def scale_edited(image, factor):
+    return image * factor + 1
+
+
+scale_edited.__qualname__ = 'scale'   # the same function after it was edited
+
+
+def test_segmentation_pipeline_caches(tmp_path):
+    image = make_image((80, 90))
+    expected = measure.label(iaf.median_and_otsutresh(iaf.subtract_background(image, 5), 1))
+    pipeline = segmentation_pipeline(radius=5, cache_dir=tmp_path)
+    assert np.array_equal(pipeline.run(image), expected)
+    assert len(list(tmp_path.glob('*.npy'))) == 3
+
+    # a new median size reuses the background subtraction
+    pipeline.update('median_and_otsutresh', mediansize=3)
+    pipeline.run(image)
+    assert len(list(tmp_path.glob('subtract_background-*.npy'))) == 1
+    assert len(list(tmp_path.glob('label-*.npy'))) == 2
+
+
+def test_step_key_changes_with_code_and_version():
+    key = Step('scale', scale, factor=2).key('input')
+    assert Step('scale', scale, factor=2).key('input') == key
+    assert Step('scale', scale, factor=3).key('input') != key
+    assert Step('scale', scale_edited, factor=2).key('input') != key
+    assert Step('scale', scale, version=2, factor=2).key('input') != key
+    # functions without python bytecode only change with the version
+    assert Step('max', np.max).key('input') == Step('max', np.max).key('input')
+    assert Step('max', np.max, version=2).key('input') != Step('max', np.max).key('input')
+
+
+def test_edited_step_is_recomputed(tmp_path):
+    image = np.ones((4, 5))
+    assert Pipeline([Step('scale', scale, factor=2)], tmp_path).run(image)[0, 0] == 2
+    assert Pipeline([Step('scale', scale_edited, factor=2)], tmp_path).run(image)[0, 0] == 3